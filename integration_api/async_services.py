@@ -0,0 +1,248 @@
+import asyncio
+import datetime
+
+import httpx
+from django.conf import settings
+from multidimensional_urlencode import urlencode as query_builder
+
+from integration_api.cache import product_groups_key, aget_or_load
+from integration_api.dataclasses import JWT, ProductFilter, ZoneSmartListing, TrackedProduct, ListingExportFailure
+from integration_api.exceptions import UpstreamAuthError, UpstreamUnavailable
+from integration_api.services import RetailCRMService, collect_created_listings
+from integration_api.transport import get_async_client, dumps_json
+
+
+async def async_try_retail_login(address: str, api_key: str) -> bool:
+    """Async version of try_retail_login.
+
+    :param address: RetailCRM shop address.
+    :param api_key: RetailCRM shop api_key.
+    :return: Boolean login state.
+    :raises UpstreamUnavailable: If RetailCRM keeps throttling requests or answering with server error.
+    :raises httpx.TransportError: If RetailCRM can't be reached.
+    """
+    try:
+        page = await AsyncRetailCRMService(address, api_key).fetch_page('/store/product-groups', {'active': '1'}, 1, 20)
+    except (UpstreamAuthError, ValueError):
+        return False  # api key is rejected or address answers with something that is not RetailCRM api
+    return isinstance(page, dict) and page.get('success') is True
+
+
+async def async_get_zone_jwt(email: str, password: str) -> JWT | bool:
+    """Async version of get_zone_jwt.
+
+    :param email: Zonesmart account email.
+    :param password: Zonesmart account password.
+    :return: JWT if credentials are valid. Otherwise, false.
+    """
+    data = {
+        "email": email,
+        "password": password
+    }
+    response = await get_async_client().post("https://api.zonesmart.com/v1/auth/jwt/create/", json=data)
+    if response.status_code == 200:
+        tokens = response.json()
+        return JWT(tokens['access'], tokens['refresh'])
+    else:
+        return False
+
+
+async def async_get_access_token(refresh: str) -> str | bool:
+    """Async version of get_access_token.
+
+    :param refresh: Zonesmart Api refresh token.
+    :return: Zonesmart Api access token.
+    """
+    data = {
+        "refresh": refresh
+    }
+    response = await get_async_client().post("https://api.zonesmart.com/v1/auth/jwt/refresh/", json=data)
+    if response.status_code == 200:
+        return response.json()['access']
+    else:
+        return False
+
+
+class AsyncZoneSmartService:
+    """Class that helps with requests to Zonesmart Api from coroutines."""
+
+    def __init__(self, access: str):
+        """
+        :param access: Zonesmart api access token.
+        """
+        self.access = access
+
+    def _get_request_header_auth(self) -> dict[str, str]:
+        """Private method that returns headers with authorization field."""
+        return {
+            'Content-Type': 'application/json',
+            'Authorization': 'JWT ' + self.access
+        }
+
+    async def check_access_token(self) -> bool:
+        """Method that sends request to Zonesmart api to check access token."""
+        response = await get_async_client().get("https://api.zonesmart.com/v1/zonesmart/marketplace/",
+                                                 headers=self._get_request_header_auth())
+        return response.status_code == 200
+
+    async def create_default_warehouse(self) -> str:
+        """Method that creates warehouse for exported products and sets it as default.
+
+        :return: Created warehouse id.
+        :raises httpx.HTTPStatusError: If Zonesmart api didn't create warehouse or didn't set it as default.
+        """
+        data = {
+            'name': 'Export from RetailCRM at: ' + datetime.datetime.now().__str__()
+        }
+        response = await get_async_client().post("https://api.zonesmart.com/v1/zonesmart/warehouse/",
+                                                  headers=self._get_request_header_auth(), json=data)
+        response.raise_for_status()
+        warehouse_id = response.json()['id']
+        response = await get_async_client().post(
+            f"https://api.zonesmart.com/v1/zonesmart/warehouse/{warehouse_id}/set_default/",
+            headers=self._get_request_header_auth())
+        response.raise_for_status()
+        return warehouse_id
+
+    async def _create_listing(self, listing: ZoneSmartListing) -> tuple[dict | None, ListingExportFailure | None]:
+        """Method that creates one listing in Zonesmart api.
+
+        :param listing: Zonesmart listing.
+        :return: Created listing from Zonesmart api or reason why listing wasn't created.
+        """
+        try:
+            response = await get_async_client().post("https://api.zonesmart.com/v1/zonesmart/listing/",
+                                                     headers=self._get_request_header_auth(),
+                                                     content=dumps_json(listing.to_payload()))
+        except UpstreamUnavailable as e:
+            return None, ListingExportFailure(listing.listing_sku, e.response.status_code, str(e))
+        except httpx.HTTPError as e:
+            return None, ListingExportFailure(listing.listing_sku, None, str(e))
+
+        if response.status_code == 201:
+            return response.json(), None
+        else:
+            return None, ListingExportFailure(listing.listing_sku, response.status_code, response.text)
+
+    async def create_listings(self, listings: list[ZoneSmartListing]) \
+            -> tuple[list[ZoneSmartListing], list[TrackedProduct], list[ListingExportFailure]]:
+        """Method that creates listings in Zonesmart api.
+
+        Up to ZONESMART_CREATE_WORKERS listings are created concurrently, results keep order of input listings.
+
+        :param listings: List of Zonesmart listings.
+        :return: Same as ZoneSmartService.create_listings. If warehouse wasn't created, all listings are failed.
+        """
+        if len(listings) == 0:
+            return list(), list(), list()  # default warehouse of account is changed only by real export
+        try:
+            warehouse_id = await self.create_default_warehouse()
+        except (UpstreamUnavailable, httpx.HTTPError) as e:
+            status_code = e.response.status_code if getattr(e, 'response', None) is not None else None
+            failures = [ListingExportFailure(listing.listing_sku, status_code, f"Warehouse wasn't created: {e}")
+                        for listing in listings]
+            return list(), list(), failures
+        semaphore = asyncio.Semaphore(max(settings.ZONESMART_CREATE_WORKERS, 1))
+
+        async def create(listing: ZoneSmartListing):
+            async with semaphore:
+                return await self._create_listing(listing)
+
+        results = await asyncio.gather(*(create(listing) for listing in listings))
+        return collect_created_listings(zip(listings, results), warehouse_id)
+
+
+class AsyncRetailCRMService:
+    """Class that helps with requests to RetailCRM Api from coroutines."""
+
+    def __init__(self, address: str, api_key: str):
+        """
+        :param address: RetailCRM address.
+        :param api_key: RetailCRM api key.
+        """
+        self.address = address
+        self.api_key = api_key
+        self._converter = RetailCRMService(address, api_key)  # used only to convert products, doesn't send requests
+
+    async def fetch_page(self, path: str, p_filter: dict, page: int, limit: int | None = None) -> dict:
+        """Method that fetches one page of paginated RetailCRM method.
+
+        :param path: Path of RetailCRM api method, for example '/store/products'.
+        :param p_filter: Filter converted by RetailCRMService._convert_filter.
+        :param page: Page number.
+        :param limit: Page size. RETAILCRM_PAGE_SIZE by default.
+        :return: RetailCRM response body.
+        """
+        parameters = {'filter': p_filter, 'limit': limit or settings.RETAILCRM_PAGE_SIZE, 'page': page}
+        url = f"{self.address}/api/v5{path}?{query_builder(parameters)}"
+        response = await get_async_client().get(url, headers={'X-API-KEY': self.api_key})
+        if response.status_code in (401, 403):  # RetailCRM answers 403 to wrong api key
+            raise UpstreamAuthError("RetailCRM api rejected api key")
+        return response.json()
+
+    async def _fetch_pages(self, path: str, p_filter: dict) -> list[dict]:
+        """Method that fetches all pages of paginated RetailCRM method.
+
+        Pagination metadata is taken from the first page, up to RETAILCRM_FETCH_WORKERS of the rest pages are
+        fetched concurrently.
+
+        :return: Response bodies of every page in page order.
+        """
+        first_page = await self.fetch_page(path, p_filter, 1)
+        semaphore = asyncio.Semaphore(max(settings.RETAILCRM_FETCH_WORKERS, 1))
+
+        async def fetch(page: int) -> dict:
+            async with semaphore:
+                return await self.fetch_page(path, p_filter, page)
+
+        total_page_count = first_page['pagination']['totalPageCount']
+        other_pages = await asyncio.gather(*(fetch(page) for page in range(2, total_page_count + 1)))
+        return [first_page, *other_pages]
+
+    async def get_product_groups(self) -> dict[str, str]:
+        """Method that gets product groups from RetailCRM Api.
+
+        Groups share cache and single-flight refresh with RetailCRMService.get_product_groups.
+
+        :return: Dictionary with product groups. Id as key, name as value.
+        """
+        return await aget_or_load(product_groups_key(self.address), self._fetch_product_groups,
+                                  settings.RETAILCRM_GROUPS_CACHE_TTL)
+
+    async def _fetch_product_groups(self) -> dict[str, str]:
+        """Method that fetches product groups from RetailCRM Api bypassing cache.
+
+        :return: Dictionary with product groups. Id as key, name as value.
+        """
+        groups = dict()
+        for page in await self._fetch_pages('/store/product-groups', {}):
+            for group in page['productGroup']:
+                groups[group['id']] = group['name']
+        return groups
+
+    async def _fetch_products(self, product_filter: dict) -> list[ZoneSmartListing]:
+        """Method that fetches products from RetailCRM api.
+
+        :param product_filter: Product filter converted by RetailCRMService._convert_filter.
+        :return: List of ZoneSmart listings. If no products available in Retail api, returns empty list.
+        """
+        groups, pages = await asyncio.gather(self.get_product_groups(),
+                                             self._fetch_pages('/store/products', product_filter))
+        return [self._converter._convert_product(product, groups) for page in pages for product in page['products']]
+
+    async def get_all_products(self) -> list[ZoneSmartListing]:
+        """Method that returns all products from RetailCRM api.
+
+        :return: Array of products from RetailCRM Api(converted to ZoneSmart format).
+                 Empty list if no products available.
+        """
+        return await self._fetch_products({})
+
+    async def get_products_with_filters(self, p_filter: ProductFilter) -> list[ZoneSmartListing]:
+        """Method that returns products from Retail Api depending of filters.
+
+        :param p_filter: Instance of class Product filter.
+        :return: Array of products from RetailCRM api(converted to ZoneSmart format).
+                 Empty list if no products available.
+        """
+        return await self._fetch_products(self._converter._convert_filter(p_filter))
@@ -0,0 +1,223 @@
+import functools
+import json
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from integration_api.async_services import AsyncRetailCRMService, AsyncZoneSmartService, async_try_retail_login, \
+    async_get_zone_jwt, async_get_access_token
+from integration_api.cache import is_validation_cached, remember_validation
+from integration_api.dataclasses import ZsListingsOut
+from integration_api.exceptions import UpstreamUnavailable
+from integration_api.serializers import RetailAuthInputSerializer, ZsAuthInputSerializer, \
+    ZsRefreshTokenInputSerializer, ZsListingsOutputSerializer, AsyncRetailGetProductsWithFilterInputSerializer, \
+    AsyncZsCreateListingsInputSerializer, AsyncZsCreateAllListingsInputSerializer
+from integration_api.services import create_periodic_tasks
+from integration_api.transport import close_async_client
+from integration_api.views import created_listings_data
+
+
+def json_response(data, status_code: int) -> JsonResponse:
+    """Returns response rendered the same way as DRF renders responses of sync views."""
+    return JsonResponse(data, status=status_code, safe=False, encoder=JSONEncoder,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def async_api_view(view):
+    """Turns coroutine into POST endpoint that handles request like APIView does.
+
+    Django 4.0 runs only function views natively under ASGI, so wrapper stays coroutine function. Request body is
+    parsed as JSON and passed to view, validation errors are returned with 400 http status code and unavailable
+    upstream api with 503 http status code. Under WSGI view runs in its own event loop, so http client of that loop
+    is closed when view finishes.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'POST':
+            return json_response({"detail": f'Method "{request.method}" not allowed.'},
+                                 status.HTTP_405_METHOD_NOT_ALLOWED)
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError as e:
+            return json_response({"detail": f"JSON parse error - {e}"}, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            return await view(request, data, *args, **kwargs)
+        except ValidationError as e:
+            return json_response(e.detail, status.HTTP_400_BAD_REQUEST)
+        except (UpstreamUnavailable, httpx.TransportError) as e:  # same as upstream_exception_handler of sync views
+            return json_response({"detail": f"Upstream api is unavailable: {e}"}, status.HTTP_503_SERVICE_UNAVAILABLE)
+        finally:
+            if not isinstance(request, ASGIRequest):  # under ASGI event loop lives as long as process
+                await close_async_client()
+
+    wrapper.csrf_exempt = True  # same as APIView, csrf_exempt decorator would make view synchronous in Django 4.0
+    return wrapper
+
+
+def is_fresh_check(request) -> bool:
+    """Checks if credentials have to be checked even if their check is cached, same as serializer_context."""
+    return request.GET.get('fresh_check') == '1'
+
+
+async def check_retail_auth(retail_auth: dict, fresh_check: bool, field: str | None = None):
+    """Checks RetailCRM credentials without blocking event loop, same as RetailAuthWithCheckInputSerializer.
+
+    :param retail_auth: Validated RetailCRM address and api key.
+    :param field: Name of nested serializer field, errors are put under it.
+    """
+    address, api_key = retail_auth['address'], retail_auth['api_key']
+    if not fresh_check and await sync_to_async(is_validation_cached)('retail', address, api_key):
+        return
+    if not await async_try_retail_login(address, api_key):
+        error = {"retail_auth_error": ["Check RetailCRM Credentials!"]}
+        raise ValidationError({field: error} if field else error)
+    await sync_to_async(remember_validation)('retail', address, api_key)
+
+
+async def check_zonesmart_auth(zonesmart_auth: dict, fresh_check: bool):
+    """Checks Zonesmart tokens without blocking event loop, same as ZsRefreshAccessTokenInputSerializer.
+
+    :param zonesmart_auth: Validated access and refresh tokens.
+    """
+    access, refresh = zonesmart_auth['access'], zonesmart_auth['refresh']
+    if not fresh_check and await sync_to_async(is_validation_cached)('zonesmart', access, refresh):
+        return
+    if await async_get_access_token(refresh) is False:
+        raise ValidationError({"zonesmart_auth": {"zonesmart_auth_error": ["refresh token is not valid!"]}})
+    if not await AsyncZoneSmartService(access).check_access_token():
+        raise ValidationError({"zonesmart_auth": {"zonesmart_auth_error": ["access token is not valid!"]}})
+    await sync_to_async(remember_validation)('zonesmart', access, refresh)
+
+
+def listings_response(zone_listings) -> JsonResponse:
+    """Returns response with listings. If no products available returns 204 http status code."""
+    if len(zone_listings) == 0:
+        return json_response({"Reason": "No available products"}, status.HTTP_204_NO_CONTENT)
+    output_serializer = ZsListingsOutputSerializer(instance=ZsListingsOut(listings=zone_listings))
+    return json_response(output_serializer.data, status.HTTP_200_OK)
+
+
+@async_api_view
+async def retail_login(request, data) -> JsonResponse:
+    """Async version of RetailCRMLogin."""
+    serializer = RetailAuthInputSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+
+    if await async_try_retail_login(**serializer.validated_data):
+        return json_response({"login_state": True}, status.HTTP_200_OK)
+    else:
+        return json_response({"login_state": False}, status.HTTP_400_BAD_REQUEST)
+
+
+@async_api_view
+async def zs_login(request, data) -> JsonResponse:
+    """Async version of ZsLogin."""
+    serializer = ZsAuthInputSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+
+    result = await async_get_zone_jwt(**serializer.validated_data)
+    if result is False:
+        return json_response({"reason": "Check credentials"}, status.HTTP_400_BAD_REQUEST)
+    else:
+        return json_response(result.get_fields(), status.HTTP_200_OK)
+
+
+@async_api_view
+async def zs_refresh(request, data) -> JsonResponse:
+    """Async version of ZsRefresh."""
+    serializer = ZsRefreshTokenInputSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+
+    access_token = await async_get_access_token(serializer.validated_data['refresh'])
+    if access_token is not False:
+        return json_response({"access": access_token}, status.HTTP_200_OK)
+    else:
+        return json_response({"reason": "Refresh token is not valid!"}, status.HTTP_400_BAD_REQUEST)
+
+
+@async_api_view
+async def retail_product_groups(request, data) -> JsonResponse:
+    """Async version of RetailProductGroups."""
+    serializer = RetailAuthInputSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+
+    groups = await AsyncRetailCRMService(**serializer.validated_data).get_product_groups()
+    if len(groups) > 0:
+        return json_response(groups, status.HTTP_200_OK)
+    else:
+        return json_response({"reason": "No groups available"}, status.HTTP_204_NO_CONTENT)
+
+
+@async_api_view
+async def retail_all_products(request, data) -> JsonResponse:
+    """Async version of RetailAllProducts."""
+    serializer = RetailAuthInputSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    await check_retail_auth(serializer.validated_data, is_fresh_check(request))
+
+    retail_service = AsyncRetailCRMService(**serializer.validated_data)
+    return listings_response(await retail_service.get_all_products())
+
+
+@async_api_view
+async def retail_products_with_filter(request, data) -> JsonResponse:
+    """Async version of RetailProductsWithFilter."""
+    serializer = AsyncRetailGetProductsWithFilterInputSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    await check_retail_auth(serializer.validated_data['retail_auth'], is_fresh_check(request), 'retail_auth')
+
+    retail_service = AsyncRetailCRMService(**serializer.validated_data['retail_auth'])
+    return listings_response(await retail_service.get_products_with_filters(serializer.validated_data['filters']))
+
+
+@async_api_view
+async def zs_create_listings(request, data) -> JsonResponse:
+    """Async version of ZsCreateListings."""
+    serializer = AsyncZsCreateListingsInputSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    await check_zonesmart_auth(serializer.validated_data['zonesmart_auth'], is_fresh_check(request))
+    await check_retail_auth(serializer.validated_data['retail_auth'], is_fresh_check(request), 'retail_auth')
+
+    access = serializer.validated_data['zonesmart_auth']['access']
+    refresh = serializer.validated_data['zonesmart_auth']['refresh']
+    sync_settings = serializer.validated_data['price_quantity_sync']
+    retail_auth = serializer.validated_data['retail_auth']
+
+    exported_listings, listings_of_tracked_products, failed_listings = \
+        await AsyncZoneSmartService(access).create_listings(serializer.validated_data['listings'])
+
+    if len(listings_of_tracked_products) > 0:
+        await sync_to_async(create_periodic_tasks)(sync_settings, listings_of_tracked_products, retail_auth, access,
+                                                   refresh)
+
+    return json_response(created_listings_data(exported_listings, failed_listings), status.HTTP_200_OK)
+
+
+@async_api_view
+async def zs_create_all_listings(request, data) -> JsonResponse:
+    """Async version of ZsCreateAllListings. Big shops should use background export of sync view instead."""
+    serializer = AsyncZsCreateAllListingsInputSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    await check_zonesmart_auth(serializer.validated_data['zonesmart_auth'], is_fresh_check(request))
+    await check_retail_auth(serializer.validated_data['retail_auth'], is_fresh_check(request), 'retail_auth')
+
+    access = serializer.validated_data['zonesmart_auth']['access']
+    refresh = serializer.validated_data['zonesmart_auth']['refresh']
+    sync_settings = serializer.validated_data['price_quantity_sync']
+    retail_auth = serializer.validated_data['retail_auth']
+
+    zone_listings = await AsyncRetailCRMService(retail_auth['address'], retail_auth['api_key']).get_all_products()
+    exported_listings, listings_of_tracked_products, failed_listings = \
+        await AsyncZoneSmartService(access).create_listings(zone_listings)
+
+    if len(listings_of_tracked_products) > 0:
+        await sync_to_async(create_periodic_tasks)(sync_settings, listings_of_tracked_products, retail_auth, access,
+                                                   refresh)
+
+    return json_response(created_listings_data(exported_listings, failed_listings), status.HTTP_200_OK)
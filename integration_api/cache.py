@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import hmac
+import time
+import uuid
+from typing import Any, Awaitable, Callable
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+_missing = object()
+_redis = None
+_scripts = dict()
+
+# Lock is released only by its owner, so process that lost expired lock can't release lock of another process.
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def get_redis() -> redis.Redis:
+    """Returns client of Redis that backs the cache, for operations that Django cache api can't express.
+
+    Connection pool of redis client reconnects by itself after fork.
+    """
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(settings.CACHES['default']['LOCATION'])
+    return _redis
+
+
+def run_script(source: str, key: str, *args):
+    """Runs lua script with EVALSHA, script is loaded to Redis on first call."""
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = get_redis().register_script(source)
+    return script(keys=[key], args=list(args))
+
+
+def get_or_load(key: str, loader: Callable[[], Any], timeout: int) -> Any:
+    """Returns value from shared cache or loads it with single-flight refresh.
+
+    Only one process at a time calls loader for the same key, the others wait until value appears in cache. If the
+    value doesn't appear in CACHE_REFRESH_LOCK_TIMEOUT seconds, waiting process calls loader by itself. Lock is
+    released only by its owner, so loader that outlived the lock doesn't release lock taken by another process.
+
+    :param key: Cache key.
+    :param loader: Function that returns fresh value.
+    :param timeout: Cache TTL in seconds.
+    :return: Cached or freshly loaded value.
+    """
+    value = cache.get(key, _missing)
+    if value is not _missing:
+        return value
+
+    lock_key = cache.make_key(f"{key}:lock")  # raw Redis key, so lock can be released by compare-and-delete
+    lock_timeout = settings.CACHE_REFRESH_LOCK_TIMEOUT
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + lock_timeout
+    while not get_redis().set(lock_key, token, nx=True, ex=lock_timeout):
+        time.sleep(0.1)
+        value = cache.get(key, _missing)
+        if value is not _missing:
+            return value
+        if time.monotonic() > deadline:
+            return loader()
+
+    try:
+        value = cache.get(key, _missing)  # value could be set while lock was being acquired
+        if value is _missing:
+            value = loader()
+            cache.set(key, value, timeout)
+        return value
+    finally:
+        run_script(RELEASE_SCRIPT, lock_key, token)
+
+
+async def aget_or_load(key: str, loader: Callable[[], Awaitable[Any]], timeout: int) -> Any:
+    """Async version of get_or_load, shares cache keys and refresh lock with it.
+
+    Lock is waited for in event loop, so coroutines that wait for the refresh don't occupy worker threads that loader
+    itself needs.
+
+    :param key: Cache key.
+    :param loader: Coroutine function that returns fresh value.
+    :param timeout: Cache TTL in seconds.
+    :return: Cached or freshly loaded value.
+    """
+    cache_get = sync_to_async(cache.get, thread_sensitive=False)
+    value = await cache_get(key, _missing)
+    if value is not _missing:
+        return value
+
+    lock_key = cache.make_key(f"{key}:lock")
+    lock_timeout = settings.CACHE_REFRESH_LOCK_TIMEOUT
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + lock_timeout
+    lock = sync_to_async(lambda: get_redis().set(lock_key, token, nx=True, ex=lock_timeout), thread_sensitive=False)
+    while not await lock():
+        await asyncio.sleep(0.1)
+        value = await cache_get(key, _missing)
+        if value is not _missing:
+            return value
+        if time.monotonic() > deadline:
+            return await loader()
+
+    try:
+        value = await cache_get(key, _missing)
+        if value is _missing:
+            value = await loader()
+            await sync_to_async(cache.set, thread_sensitive=False)(key, value, timeout)
+        return value
+    finally:
+        await sync_to_async(run_script, thread_sensitive=False)(RELEASE_SCRIPT, lock_key, token)
+
+
+def product_groups_key(address: str) -> str:
+    """Returns cache key of RetailCRM product groups dictionary."""
+    return f"retail_product_groups:{address.rstrip('/')}"
+
+
+def invalidate_product_groups(address: str):
+    """Removes cached RetailCRM product groups of shop.
+
+    :param address: RetailCRM shop address.
+    """
+    cache.delete(product_groups_key(address))
+
+
+def _credentials_key(kind: str, secrets: tuple[str, ...]) -> str:
+    """Returns cache key of credentials validation. Key contains only HMAC of credentials, not credentials itself."""
+    digest = hmac.new(settings.SECRET_KEY.encode(), '\0'.join(secrets).encode(), hashlib.sha256).hexdigest()
+    return f"valid_credentials:{kind}:{digest}"
+
+
+def is_validation_cached(kind: str, *secrets: str) -> bool:
+    """Checks if credentials were successfully validated less than CREDENTIALS_VALIDATION_CACHE_TTL seconds ago.
+
+    :param kind: Kind of credentials, for example 'retail'.
+    :param secrets: Credentials.
+    """
+    return cache.get(_credentials_key(kind, secrets)) is True
+
+
+def remember_validation(kind: str, *secrets: str):
+    """Saves successful credentials validation for CREDENTIALS_VALIDATION_CACHE_TTL seconds.
+
+    :param kind: Kind of credentials, for example 'retail'.
+    :param secrets: Credentials.
+    """
+    cache.set(_credentials_key(kind, secrets), True, settings.CREDENTIALS_VALIDATION_CACHE_TTL)
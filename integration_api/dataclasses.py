@@ -42,6 +42,17 @@ class ZoneSmartProduct:
     condition: typing.Optional[str]
     attributes: typing.Optional[typing.List[dict]]
 
+    def to_payload(self) -> dict:
+        """Returns product as Zonesmart api request data."""
+        return {
+            'sku': self.sku,
+            'quantity': self.quantity,
+            'price': self.price,
+            'product_code': self.product_code,
+            'condition': self.condition,
+            'attributes': self.attributes
+        }
+
 
 class ProductConverter:
     """Class that converts RetailCRM representation of product to Zonesmart product."""
@@ -93,8 +104,26 @@ class ZoneSmartListing:
     main_image: typing.Optional[str]
     extra_images: typing.Optional[list[str]]
 
+    def to_payload(self) -> dict:
+        """Returns listing as Zonesmart api request data.
+
+        Dict is built directly from fields, nested values aren't copied, so it is much cheaper than
+        json.loads(to_json()). Body is the same as to_json() output.
+        """
+        return {
+            'title': self.title,
+            'description': self.description,
+            'listing_sku': self.listing_sku,
+            'category_name': self.category_name,
+            'brand': self.brand,
+            'currency': self.currency,
+            'products': [product.to_payload() for product in self.products],
+            'main_image': self.main_image,
+            'extra_images': self.extra_images
+        }
+
     def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__, ensure_ascii=False)
+        return json.dumps(self.to_payload(), ensure_ascii=False)
 
 
 class ListingConverter:
@@ -138,6 +167,14 @@ class ZsListingsOut:
     listings: typing.List[ZoneSmartListing]
 
 
+@dataclass
+class CatalogDelta:
+    """Class representing products of RetailCRM catalog that were changed since previous delta fetch."""
+    added: typing.List[ZoneSmartListing]
+    changed: typing.List[ZoneSmartListing]
+    removed: typing.List[str]  # listing skus of removed products
+
+
 @dataclass
 class TrackedProduct:
     """Class representing successfully exported product(From retail to zonesmart) that is going to be used in periodic tasks."""
@@ -147,10 +184,45 @@ class TrackedProduct:
     warehouse_id: str
 
 
+@dataclass
+class ZoneProductState:
+    """Class representing price and quantities of product in Zonesmart api."""
+    price: str
+    quantities: dict[str, int]  # warehouse id as key, quantity as value
+
+
+@dataclass
+class SyncStats:
+    """Class representing result of price or quantity sync."""
+    products: int = 0
+    updated: int = 0
+    failed: int = 0
+
+    def __add__(self, other: 'SyncStats') -> 'SyncStats':
+        return SyncStats(self.products + other.products, self.updated + other.updated, self.failed + other.failed)
+
+
+@dataclass
+class InventoryUpdate:
+    """Class representing quantity of product on warehouse that has to be set in Zonesmart api."""
+    product: str
+    warehouse: str
+    quantity: int
+
+
+@dataclass
+class ListingExportFailure:
+    """Class representing listing that wasn't created in Zonesmart api."""
+    listing_sku: typing.Optional[str]
+    status_code: typing.Optional[int]
+    reason: str
+
+
 @dataclass
 class PriceQuantitySync:
     """Class that handles price and quantity sync settings."""
     quantity_sync: bool
     price_sync: bool
     price_sync_period: typing.Optional[TimeInterval]
-    quantity_sync_period: typing.Optional[TimeInterval]
\ No newline at end of file
+    quantity_sync_period: typing.Optional[TimeInterval]
+    combined_sync: bool = False  # one periodic task syncs both price and quantity
\ No newline at end of file
@@ -13,3 +13,17 @@ class TimeInterval(Enum):
 class TaskStatus(Enum):
     active = 'Active'
     disabled = 'Disabled'
+
+
+class OverlapPolicy(Enum):
+    """What happens with sync run of checker that is started while previous run is still in progress."""
+    skip = 'Skip'  # run is dropped
+    coalesce = 'Coalesce'  # all runs started during previous one are merged into one run that starts right after it
+
+
+class ExportStatus(Enum):
+    """Status of background export of listings to Zonesmart."""
+    pending = 'Pending'
+    running = 'Running'
+    finished = 'Finished'
+    failed = 'Failed'
@@ -0,0 +1,23 @@
+import requests
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import exception_handler
+
+
+class UpstreamAuthError(Exception):
+    """Raised when Zonesmart or RetailCRM api rejects credentials."""
+
+
+class UpstreamUnavailable(requests.RequestException):
+    """Raised when Zonesmart or RetailCRM api keeps throttling requests or answering with server error."""
+
+
+def upstream_exception_handler(exc, context):
+    """DRF exception handler that answers with 503 http status code if upstream api is unavailable.
+
+    Throttling, server errors and network errors of upstream api are not problems of request, so client can repeat
+    request later instead of checking credentials.
+    """
+    if isinstance(exc, (UpstreamUnavailable, requests.ConnectionError, requests.Timeout)):
+        return Response({"detail": f"Upstream api is unavailable: {exc}"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return exception_handler(exc, context)
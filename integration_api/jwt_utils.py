@@ -0,0 +1,17 @@
+import base64
+import json
+
+
+def get_jwt_payload(token: str) -> dict | None:
+    """Returns payload of JWT without verifying its signature.
+
+    :param token: JWT.
+    :return: Token claims. None if token can't be decoded.
+    """
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+    except (IndexError, TypeError, ValueError):
+        return None
+    return claims if isinstance(claims, dict) else None
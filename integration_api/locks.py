@@ -0,0 +1,128 @@
+import contextlib
+import time
+import uuid
+
+import redis
+from django.conf import settings
+
+from integration_api.cache import get_redis, run_script, RELEASE_SCRIPT
+
+# Lock is extended only by its owner, so run that lost expired lock can't extend lock of the next run.
+EXTEND_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def sync_lock_key(checker) -> str:
+    """Returns Redis key of lock that is held while checker is synced."""
+    return f"sync_lock:{checker.__class__.__name__}:{checker.pk}"
+
+
+def sync_rerun_key(checker) -> str:
+    """Returns Redis key of flag that asks for one more sync run after the running one."""
+    return f"sync_rerun:{checker.__class__.__name__}:{checker.pk}"
+
+
+def catalog_lock_key(account: str) -> str:
+    """Returns Redis key of lock that is held while delta catalog cursor of account is moved."""
+    return f"catalog_lock:{account}"
+
+
+def acquire_sync_lock(checker) -> str | None:
+    """Takes lock of checker for SYNC_LOCK_TIMEOUT seconds.
+
+    If Redis is not available, sync is not blocked.
+
+    :return: Token of lock owner or None if checker is synced by another run.
+    """
+    token = uuid.uuid4().hex
+    try:
+        if get_redis().set(sync_lock_key(checker), token, nx=True, ex=settings.SYNC_LOCK_TIMEOUT):
+            return token
+        return None
+    except redis.RedisError as e:
+        print(f"Sync lock of {sync_lock_key(checker)} is not taken: {e}")
+        return token
+
+
+def extend_sync_lock(checker, token: str):
+    """Resets timeout of lock, so lock of long sync run doesn't expire while the run is alive.
+
+    :param token: Token returned by acquire_sync_lock.
+    """
+    try:
+        run_script(EXTEND_SCRIPT, sync_lock_key(checker), token, settings.SYNC_LOCK_TIMEOUT)
+    except redis.RedisError:
+        pass
+
+
+def release_sync_lock(checker, token: str):
+    """Releases lock of checker if it is still owned by token.
+
+    :param token: Token returned by acquire_sync_lock.
+    """
+    try:
+        run_script(RELEASE_SCRIPT, sync_lock_key(checker), token)
+    except redis.RedisError:
+        pass
+
+
+def request_rerun(checker):
+    """Asks running sync of checker to start one more run when it finishes. Any amount of requests made during one run
+    leads to a single rerun.
+    """
+    try:
+        get_redis().set(sync_rerun_key(checker), 1, ex=settings.SYNC_LOCK_TIMEOUT)
+    except redis.RedisError:
+        pass
+
+
+def pop_rerun(checker) -> bool:
+    """Removes rerun request of checker.
+
+    :return: True if rerun was requested.
+    """
+    try:
+        return get_redis().delete(sync_rerun_key(checker)) == 1
+    except redis.RedisError:
+        return False
+
+
+@contextlib.contextmanager
+def catalog_lock(account: str):
+    """Holds lock of delta catalog cursor of account, waits until concurrent delta fetch of account releases it.
+
+    Lock is taken for SYNC_LOCK_TIMEOUT seconds, long fetch keeps it with extend_catalog_lock. If Redis is not
+    available, fetch is not blocked.
+
+    :param account: Account returned by get_catalog_account.
+    :return: Token of lock owner.
+    """
+    key = catalog_lock_key(account)
+    token = uuid.uuid4().hex
+    try:
+        while not get_redis().set(key, token, nx=True, ex=settings.SYNC_LOCK_TIMEOUT):
+            time.sleep(0.5)
+    except redis.RedisError as e:
+        print(f"Catalog lock of {key} is not taken: {e}")
+    try:
+        yield token
+    finally:
+        try:
+            run_script(RELEASE_SCRIPT, key, token)
+        except redis.RedisError:
+            pass
+
+
+def extend_catalog_lock(account: str, token: str):
+    """Resets timeout of catalog lock, so lock of long delta fetch doesn't expire while the fetch is alive.
+
+    :param token: Token yielded by catalog_lock.
+    """
+    try:
+        run_script(EXTEND_SCRIPT, catalog_lock_key(account), token, settings.SYNC_LOCK_TIMEOUT)
+    except redis.RedisError:
+        pass
@@ -0,0 +1,51 @@
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework_dataclasses.serializers import DataclassSerializer
+
+from integration_api.dataclasses import ZoneSmartListing, ZoneSmartProduct, ZsListingsOut
+from integration_api.management.commands.bench_listing_payload import make_listings
+from integration_api.serializers import ZsListingsOutputSerializer
+
+
+def make_edge_listings() -> list[ZoneSmartListing]:
+    """Returns listings with empty optional fields and values of other types than dataclass fields declare."""
+    products = [ZoneSmartProduct(101, 2.0, 15.5, None, None, None),
+                ZoneSmartProduct('102', 0, '0', 'code', 'NEW', [{'name': 'Цвет', 'value': None}, {1: 2}])]
+    return [ZoneSmartListing('Товар', '', None, None, None, None, [], None, None),
+            ZoneSmartListing(7, 'Описание', 7, 'cat', 'brand', 'RUB', products, 'https://img.test/7.jpg',
+                             ['https://img.test/7-1.jpg', None])]
+
+
+def reference_data(listings: list[ZoneSmartListing]) -> dict:
+    """Returns output of ZsListingsOutputSerializer before compiled representation."""
+    return {
+        'listing_count': len(listings),
+        'listings': DataclassSerializer(instance=listings, dataclass=ZoneSmartListing, many=True).data
+    }
+
+
+class Command(BaseCommand):
+    help = "Checks that compiled listing output matches DataclassSerializer and measures both on synthetic catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=5000, help="Number of synthetic listings.")
+        parser.add_argument('--offers', type=int, default=5, help="Number of products in every listing.")
+        parser.add_argument('--repeat', type=int, default=3, help="Best of how many runs is reported.")
+
+    def handle(self, *args, **options):
+        listings = make_edge_listings() + make_listings(options['listings'], options['offers'])
+        renderer = JSONRenderer()
+
+        def compiled():
+            return ZsListingsOutputSerializer(instance=ZsListingsOut(listings=listings)).data
+
+        expected, actual = reference_data(listings), compiled()
+        if expected != actual or renderer.render(expected) != renderer.render(actual):
+            raise CommandError("Compiled listing output differs from DataclassSerializer output")
+        self.stdout.write(f"Output of {len(listings)} listings matches DataclassSerializer")
+
+        for name, func in (('DataclassSerializer', lambda: reference_data(listings)), ('compiled', compiled)):
+            best = min(timeit.repeat(func, number=1, repeat=options['repeat']))
+            self.stdout.write(f"{name}: {best:.3f} s, {best / len(listings) * 1e6:.1f} us per listing")
@@ -0,0 +1,58 @@
+import json
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from integration_api.dataclasses import ZoneSmartListing, ListingConverter, ProductConverter
+from integration_api.transport import dumps_json, orjson
+
+
+def make_listings(count: int, offers: int) -> list[ZoneSmartListing]:
+    """Returns synthetic listings that look like products converted from RetailCRM.
+
+    :param count: Number of listings.
+    :param offers: Number of products in every listing.
+    """
+    listings = list()
+    for i in range(count):
+        products = [ProductConverter(f"{i}-{j}", j, f"{i * 10 + j}.0", None,
+                                     {'Цвет': 'красный', 'Размер': str(j)}).get_zonesmart_product()
+                    for j in range(offers)]
+        listings.append(ListingConverter(f"Товар {i}", "Описание товара " * 10, str(i), f"Категория {i % 20}",
+                                         "Бренд", products, f"https://img.test/{i}.jpg",
+                                         [f"https://img.test/{i}-{k}.jpg" for k in range(3)]).get_zonesmart_listing())
+    return listings
+
+
+class Command(BaseCommand):
+    help = "Measures per listing cost of building Zonesmart listing request body."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=1000, help="Number of synthetic listings.")
+        parser.add_argument('--offers', type=int, default=5, help="Number of products in every listing.")
+        parser.add_argument('--repeat', type=int, default=5, help="Best of how many runs is reported.")
+
+    def handle(self, *args, **options):
+        listings = make_listings(options['listings'], options['offers'])
+        for listing in listings:
+            if json.loads(dumps_json(listing.to_payload())) != json.loads(listing.to_json()):
+                raise CommandError(f"Request body of listing {listing.listing_sku} differs from to_json()")
+
+        def to_json_round_trip():  # what requests did with json=json.loads(listing.to_json())
+            for listing in listings:
+                json.dumps(json.loads(listing.to_json())).encode()
+
+        def payload_json():  # dumps_json without orjson
+            for listing in listings:
+                json.dumps(listing.to_payload(), ensure_ascii=False, separators=(',', ':')).encode()
+
+        def payload():
+            for listing in listings:
+                dumps_json(listing.to_payload())
+
+        cases = [('to_json + json.loads + json.dumps', to_json_round_trip), ('to_payload + json', payload_json)]
+        if orjson is not None:
+            cases.append(('to_payload + orjson', payload))
+        for name, func in cases:
+            best = min(timeit.repeat(func, number=1, repeat=options['repeat']))
+            self.stdout.write(f"{name}: {best / len(listings) * 1e6:.1f} us per listing")
@@ -0,0 +1,24 @@
+# Generated by Django 4.0.7 on 2026-10-16 23:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integration_api', '0002_sync_checker'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zone_product_id', models.CharField(max_length=64, unique=True)),
+                ('last_price', models.CharField(max_length=32, null=True)),
+                ('last_quantity', models.IntegerField(null=True)),
+                ('price_checked_at', models.DateTimeField(null=True)),
+                ('quantity_checked_at', models.DateTimeField(null=True)),
+            ],
+        ),
+    ]
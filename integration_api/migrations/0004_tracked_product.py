@@ -0,0 +1,63 @@
+# Generated by Django 4.0.7 on 2026-10-16 23:03
+
+import json
+
+from django.db import migrations, models
+
+
+def move_products_to_table(apps, schema_editor):
+    """Moves products from JSON field of checkers to TrackedProduct table and passes only checker id to tasks."""
+    TrackedProduct = apps.get_model('integration_api', 'TrackedProduct')
+    for model_name in ('QuantityChecker', 'PriceChecker', 'SyncChecker'):
+        checker_model = apps.get_model('integration_api', model_name)
+        for checker in checker_model.objects.all():
+            products = [TrackedProduct(retail_id=product['retail_id'],
+                                       zone_listing_id=product['zone_listing_id'],
+                                       zone_product_id=product['zone_product_id'],
+                                       warehouse_id=product['warehouse_id'])
+                        for product in json.loads(checker.products or '[]')]
+            products = TrackedProduct.objects.bulk_create(products, batch_size=1000)
+            checker_model.tracked_products.through.objects.bulk_create(
+                [checker_model.tracked_products.through(**{f'{model_name.lower()}_id': checker.pk,
+                                                           'trackedproduct_id': product.pk})
+                 for product in products],
+                batch_size=1000)
+            if checker.task is not None:
+                checker.task.args = json.dumps([checker.pk])
+                checker.task.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integration_api', '0003_product_sync_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('retail_id', models.CharField(db_index=True, max_length=64)),
+                ('zone_listing_id', models.CharField(db_index=True, max_length=64)),
+                ('zone_product_id', models.CharField(db_index=True, max_length=64)),
+                ('warehouse_id', models.CharField(max_length=64)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='pricechecker',
+            name='tracked_products',
+            field=models.ManyToManyField(to='integration_api.trackedproduct'),
+        ),
+        migrations.AddField(
+            model_name='quantitychecker',
+            name='tracked_products',
+            field=models.ManyToManyField(to='integration_api.trackedproduct'),
+        ),
+        migrations.AddField(
+            model_name='syncchecker',
+            name='tracked_products',
+            field=models.ManyToManyField(to='integration_api.trackedproduct'),
+        ),
+        migrations.RunPython(move_products_to_table, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.0.7 on 2026-10-16 23:03
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integration_api', '0004_tracked_product'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='pricechecker',
+            name='products',
+        ),
+        migrations.RemoveField(
+            model_name='quantitychecker',
+            name='products',
+        ),
+        migrations.RemoveField(
+            model_name='syncchecker',
+            name='products',
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.0.7 on 2026-10-16 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integration_api', '0005_remove_checker_products'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pricechecker',
+            name='max_parallelism',
+            field=models.PositiveSmallIntegerField(default=4),
+        ),
+        migrations.AddField(
+            model_name='pricechecker',
+            name='shard_size',
+            field=models.PositiveIntegerField(default=5000),
+        ),
+        migrations.AddField(
+            model_name='quantitychecker',
+            name='max_parallelism',
+            field=models.PositiveSmallIntegerField(default=4),
+        ),
+        migrations.AddField(
+            model_name='quantitychecker',
+            name='shard_size',
+            field=models.PositiveIntegerField(default=5000),
+        ),
+        migrations.AddField(
+            model_name='syncchecker',
+            name='max_parallelism',
+            field=models.PositiveSmallIntegerField(default=4),
+        ),
+        migrations.AddField(
+            model_name='syncchecker',
+            name='shard_size',
+            field=models.PositiveIntegerField(default=5000),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 4.0.7 on 2026-10-16 23:08
+
+import datetime
+
+from django.db import migrations, models
+import enumchoicefield.fields
+import integration_api.enums
+
+
+# copy of integration_api.models.get_period_duration at the time of this migration, period value as key
+PERIOD_DURATIONS = {
+    '1 minute': datetime.timedelta(minutes=1),
+    '5 minutes': datetime.timedelta(minutes=5),
+    '15 minutes': datetime.timedelta(minutes=15),
+    '1 hour': datetime.timedelta(hours=1),
+    '1 day': datetime.timedelta(days=1),
+}
+
+
+def get_period_duration(period) -> datetime.timedelta:
+    """Returns duration of sync period."""
+    return PERIOD_DURATIONS[period.value]
+
+
+def set_tasks_expiration(apps, schema_editor):
+    """Makes queued runs of existing periodic tasks expire after one period of checker."""
+    for model_name in ('QuantityChecker', 'PriceChecker', 'SyncChecker'):
+        checker_model = apps.get_model('integration_api', model_name)
+        for checker in checker_model.objects.exclude(task=None).select_related('task'):
+            if model_name == 'SyncChecker':
+                period = min(checker.price_period, checker.quantity_period, key=get_period_duration)
+            else:
+                period = checker.period
+            checker.task.expire_seconds = int(get_period_duration(period).total_seconds())
+            checker.task.save(update_fields=['expire_seconds'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integration_api', '0006_checker_sharding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pricechecker',
+            name='last_skipped_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pricechecker',
+            name='overlap_policy',
+            field=enumchoicefield.fields.EnumChoiceField(default=integration_api.enums.OverlapPolicy['coalesce'], enum_class=integration_api.enums.OverlapPolicy, max_length=8),
+        ),
+        migrations.AddField(
+            model_name='pricechecker',
+            name='skipped_runs',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='quantitychecker',
+            name='last_skipped_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='quantitychecker',
+            name='overlap_policy',
+            field=enumchoicefield.fields.EnumChoiceField(default=integration_api.enums.OverlapPolicy['coalesce'], enum_class=integration_api.enums.OverlapPolicy, max_length=8),
+        ),
+        migrations.AddField(
+            model_name='quantitychecker',
+            name='skipped_runs',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='syncchecker',
+            name='last_skipped_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='syncchecker',
+            name='overlap_policy',
+            field=enumchoicefield.fields.EnumChoiceField(default=integration_api.enums.OverlapPolicy['coalesce'], enum_class=integration_api.enums.OverlapPolicy, max_length=8),
+        ),
+        migrations.AddField(
+            model_name='syncchecker',
+            name='skipped_runs',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(set_tasks_expiration, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.0.7 on 2026-10-16 23:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integration_api', '0007_checker_overlap_policy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(max_length=64, unique=True)),
+                ('synced_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CatalogProductState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('listing_sku', models.CharField(max_length=64)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('cursor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='products', to='integration_api.catalogcursor')),
+            ],
+            options={
+                'unique_together': {('cursor', 'listing_sku')},
+            },
+        ),
+    ]
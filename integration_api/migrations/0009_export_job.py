@@ -0,0 +1,54 @@
+# Generated by Django 4.0.7 on 2026-10-16 23:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+import enumchoicefield.fields
+import integration_api.enums
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integration_api', '0008_catalog_cursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', enumchoicefield.fields.EnumChoiceField(default=integration_api.enums.ExportStatus['pending'], enum_class=integration_api.enums.ExportStatus, max_length=8)),
+                ('retail_address', models.CharField(max_length=70)),
+                ('retail_api_key', models.CharField(max_length=100)),
+                ('access_token', models.TextField()),
+                ('refresh_token', models.TextField()),
+                ('quantity_sync', models.BooleanField(default=False)),
+                ('price_sync', models.BooleanField(default=False)),
+                ('combined_sync', models.BooleanField(default=False)),
+                ('quantity_sync_period', enumchoicefield.fields.EnumChoiceField(blank=True, enum_class=integration_api.enums.TimeInterval, max_length=15, null=True)),
+                ('price_sync_period', enumchoicefield.fields.EnumChoiceField(blank=True, enum_class=integration_api.enums.TimeInterval, max_length=15, null=True)),
+                ('warehouse_id', models.CharField(blank=True, max_length=64, null=True)),
+                ('next_page', models.PositiveIntegerField(default=1)),
+                ('total_pages', models.PositiveIntegerField(blank=True, null=True)),
+                ('processed_listings', models.PositiveIntegerField(default=0)),
+                ('created_listings', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('tracked_products', models.ManyToManyField(to='integration_api.trackedproduct')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ExportFailure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('listing_sku', models.CharField(max_length=64, null=True)),
+                ('status_code', models.PositiveSmallIntegerField(null=True)),
+                ('reason', models.TextField()),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='failures', to='integration_api.exportjob')),
+            ],
+        ),
+    ]
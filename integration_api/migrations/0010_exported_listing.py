@@ -0,0 +1,25 @@
+# Generated by Django 4.0.7 on 2026-10-16 23:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integration_api', '0009_export_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportedListing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('listing_sku', models.CharField(max_length=64)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exported', to='integration_api.exportjob')),
+            ],
+            options={
+                'unique_together': {('job', 'listing_sku')},
+            },
+        ),
+    ]
@@ -1,11 +1,102 @@
 from django_celery_beat.models import IntervalSchedule
+import datetime
+import hashlib
 import json
+import uuid
+from django.conf import settings
 from django.db import models
 from enumchoicefield import EnumChoiceField
 from django_celery_beat.models import PeriodicTask, IntervalSchedule
 from django.utils import timezone
 
-from integration_api.enums import TimeInterval, TaskStatus
+from integration_api.enums import TimeInterval, TaskStatus, OverlapPolicy, ExportStatus
+
+
+class TrackedProduct(models.Model):
+    """Successfully exported product(From retail to zonesmart) that is used in periodic tasks."""
+    retail_id = models.CharField(max_length=64, db_index=True)
+    zone_listing_id = models.CharField(max_length=64, db_index=True)
+    zone_product_id = models.CharField(max_length=64, db_index=True)
+    warehouse_id = models.CharField(max_length=64)
+
+
+def iter_product_chunks(products: models.QuerySet, chunk_size: int):
+    """Yields tracked products as dictionaries in chunks ordered by primary key.
+
+    :param products: Queryset of tracked products.
+    :param chunk_size: Amount of products in chunk.
+    """
+    last_pk = 0
+    while True:
+        chunk = list(products.filter(pk__gt=last_pk).order_by('pk')
+                     .values('pk', 'retail_id', 'zone_listing_id', 'zone_product_id', 'warehouse_id')[:chunk_size])
+        if len(chunk) == 0:
+            return
+        yield chunk
+        last_pk = chunk[-1]['pk']
+
+
+def delete_orphan_products(product_ids: list[int]):
+    """Deletes tracked products that are not used by any checker anymore.
+
+    Products of export jobs that are not finished are kept, job creates checkers for them when it finishes.
+
+    :param product_ids: Primary keys of tracked products that were used by deleted checker.
+    """
+    unfinished_jobs = ExportJob.objects.exclude(status=ExportStatus.finished)
+    for i in range(0, len(product_ids), 1000):
+        TrackedProduct.objects.filter(pk__in=product_ids[i:i + 1000], quantitychecker=None, pricechecker=None,
+                                      syncchecker=None).exclude(exportjob__in=unfinished_jobs).delete()
+
+
+def get_interval_schedule(period: TimeInterval) -> IntervalSchedule:
+    """Returns celery beat interval schedule of sync period."""
+    match period:
+        case TimeInterval.one_min:
+            return IntervalSchedule.objects.get(every=1, period='minutes')
+        case TimeInterval.five_minutes:
+            return IntervalSchedule.objects.get(every=5, period='minutes')
+        case TimeInterval.fifteen_minutes:
+            return IntervalSchedule.objects.get(every=15, period='minutes')
+        case TimeInterval.one_hour:
+            return IntervalSchedule.objects.get(every=1, period='hours')
+        case TimeInterval.one_day:
+            return IntervalSchedule.objects.get(every=1, period='days')
+
+
+def get_period_duration(period: TimeInterval) -> datetime.timedelta:
+    """Returns duration of sync period."""
+    match period:
+        case TimeInterval.one_min:
+            return datetime.timedelta(minutes=1)
+        case TimeInterval.five_minutes:
+            return datetime.timedelta(minutes=5)
+        case TimeInterval.fifteen_minutes:
+            return datetime.timedelta(minutes=15)
+        case TimeInterval.one_hour:
+            return datetime.timedelta(hours=1)
+        case TimeInterval.one_day:
+            return datetime.timedelta(days=1)
+
+
+def get_start_time(checker, period: TimeInterval) -> datetime.datetime:
+    """Returns first run time of checker task.
+
+    Every checker gets its own phase inside the period, that is hash of checker id modulo spread part of the period.
+    Checkers created at the same moment run at different seconds of the period instead of all at once.
+
+    :param checker: Saved checker.
+    :param period: Sync period of checker.
+    """
+    now = timezone.now()
+    period_seconds = int(get_period_duration(period).total_seconds())
+    spread = int(period_seconds * settings.SYNC_START_SPREAD)
+    if spread <= 0:
+        return now
+
+    digest = hashlib.sha256(f"{checker.__class__.__name__}:{checker.pk}".encode()).digest()
+    offset = int.from_bytes(digest[:8], 'big') % spread
+    return now + datetime.timedelta(seconds=(offset - now.timestamp()) % period_seconds)
 
 
 class QuantityChecker(models.Model):
@@ -15,7 +106,12 @@ class QuantityChecker(models.Model):
     refresh_token = models.TextField(null=True)
     period = EnumChoiceField(TimeInterval, default=TimeInterval.one_min)
     status = EnumChoiceField(TaskStatus, default=TaskStatus.active)
-    products = models.TextField(null=True)
+    tracked_products = models.ManyToManyField('TrackedProduct')
+    shard_size = models.PositiveIntegerField(default=5000)  # products synced by one worker task
+    max_parallelism = models.PositiveSmallIntegerField(default=4)  # worker tasks of one run that are run in parallel
+    overlap_policy = EnumChoiceField(OverlapPolicy, default=OverlapPolicy.coalesce)
+    skipped_runs = models.PositiveIntegerField(default=0)  # runs that weren't started because previous one was running
+    last_skipped_at = models.DateTimeField(null=True, blank=True)
     task = models.OneToOneField(
         PeriodicTask,
         on_delete=models.CASCADE,
@@ -24,32 +120,32 @@ class QuantityChecker(models.Model):
     )
 
     def delete(self, *args, **kwargs):
+        product_ids = list(self.tracked_products.values_list('pk', flat=True))
         if self.task is not None:
             self.task.delete()
-        return super(self.__class__, self).delete(*args, **kwargs)
+        result = super(self.__class__, self).delete(*args, **kwargs)
+        delete_orphan_products(product_ids)
+        return result
 
     @property
     def interval_schedule(self):
-        match self.period:
-            case TimeInterval.one_min:
-                return IntervalSchedule.objects.get(every=1, period='minutes')
-            case TimeInterval.five_minutes:
-                return IntervalSchedule.objects.get(every=5, period='minutes')
-            case TimeInterval.fifteen_minutes:
-                return IntervalSchedule.objects.get(every=15, period='minutes')
-            case TimeInterval.one_hour:
-                return IntervalSchedule.objects.get(every=1, period='hours')
-            case TimeInterval.one_day:
-                return IntervalSchedule.objects.get(every=1, period='days')
+        return get_interval_schedule(self.period)
+
+    @property
+    def expire_seconds(self) -> int:
+        """Run that waits in queue longer than one period is dropped, so queue doesn't grow when workers are slow."""
+        return int(get_period_duration(self.period).total_seconds())
 
     def setup_task(self):
+        start_time = get_start_time(self, self.period)
         self.task = PeriodicTask.objects.create(
             name=f"Task-quantity-update: {self.retail_address} #{QuantityChecker.objects.filter(retail_address=self.retail_address).count().__str__()}",
             task='update_products_quantity',
             interval=self.interval_schedule,
-            args=json.dumps([self.retail_address, self.retail_api_key, self.access_token, self.refresh_token,
-                             self.products]),
-            start_time=timezone.now()
+            args=json.dumps([self.id]),
+            start_time=start_time,
+            last_run_at=start_time - get_period_duration(self.period),  # beat counts first run from last run time
+            expire_seconds=self.expire_seconds
         )
         self.save()
 
@@ -61,7 +157,12 @@ class PriceChecker(models.Model):
     refresh_token = models.TextField(null=True)
     period = EnumChoiceField(TimeInterval, default=TimeInterval.one_min)
     status = EnumChoiceField(TaskStatus, default=TaskStatus.active)
-    products = models.TextField(null=True)
+    tracked_products = models.ManyToManyField('TrackedProduct')
+    shard_size = models.PositiveIntegerField(default=5000)  # products synced by one worker task
+    max_parallelism = models.PositiveSmallIntegerField(default=4)  # worker tasks of one run that are run in parallel
+    overlap_policy = EnumChoiceField(OverlapPolicy, default=OverlapPolicy.coalesce)
+    skipped_runs = models.PositiveIntegerField(default=0)  # runs that weren't started because previous one was running
+    last_skipped_at = models.DateTimeField(null=True, blank=True)
     task = models.OneToOneField(
         PeriodicTask,
         on_delete=models.CASCADE,
@@ -70,31 +171,198 @@ class PriceChecker(models.Model):
     )
 
     def delete(self, *args, **kwargs):
+        product_ids = list(self.tracked_products.values_list('pk', flat=True))
         if self.task is not None:
             self.task.delete()
-        return super(self.__class__, self).delete(*args, **kwargs)
+        result = super(self.__class__, self).delete(*args, **kwargs)
+        delete_orphan_products(product_ids)
+        return result
 
     @property
     def interval_schedule(self):
-        match self.period:
-            case TimeInterval.one_min:
-                return IntervalSchedule.objects.get(every=1, period='minutes')
-            case TimeInterval.five_minutes:
-                return IntervalSchedule.objects.get(every=5, period='minutes')
-            case TimeInterval.fifteen_minutes:
-                return IntervalSchedule.objects.get(every=15, period='minutes')
-            case TimeInterval.one_hour:
-                return IntervalSchedule.objects.get(every=1, period='hours')
-            case TimeInterval.one_day:
-                return IntervalSchedule.objects.get(every=1, period='days')
+        return get_interval_schedule(self.period)
+
+    @property
+    def expire_seconds(self) -> int:
+        """Run that waits in queue longer than one period is dropped, so queue doesn't grow when workers are slow."""
+        return int(get_period_duration(self.period).total_seconds())
 
     def setup_task(self):
+        start_time = get_start_time(self, self.period)
         self.task = PeriodicTask.objects.create(
             name=f"Task-price-update: {self.retail_address} #{PriceChecker.objects.filter(retail_address=self.retail_address).count().__str__()}",
             task='update_products_price',
             interval=self.interval_schedule,
-            args=json.dumps([self.retail_address, self.retail_api_key, self.access_token, self.refresh_token,
-                             self.products]),
-            start_time=timezone.now()
+            args=json.dumps([self.id]),
+            start_time=start_time,
+            last_run_at=start_time - get_period_duration(self.period),  # beat counts first run from last run time
+            expire_seconds=self.expire_seconds
         )
         self.save()
+
+
+class SyncChecker(models.Model):
+    """Checker that syncs both price and quantity of products in one task run."""
+    retail_address = models.CharField(max_length=70, blank=False)
+    retail_api_key = models.CharField(max_length=100, blank=False)
+    access_token = models.TextField(null=True)
+    refresh_token = models.TextField(null=True)
+    price_period = EnumChoiceField(TimeInterval, default=TimeInterval.one_min)
+    quantity_period = EnumChoiceField(TimeInterval, default=TimeInterval.one_min)
+    price_synced_at = models.DateTimeField(null=True, blank=True)
+    quantity_synced_at = models.DateTimeField(null=True, blank=True)
+    status = EnumChoiceField(TaskStatus, default=TaskStatus.active)
+    tracked_products = models.ManyToManyField('TrackedProduct')
+    shard_size = models.PositiveIntegerField(default=5000)  # products synced by one worker task
+    max_parallelism = models.PositiveSmallIntegerField(default=4)  # worker tasks of one run that are run in parallel
+    overlap_policy = EnumChoiceField(OverlapPolicy, default=OverlapPolicy.coalesce)
+    skipped_runs = models.PositiveIntegerField(default=0)  # runs that weren't started because previous one was running
+    last_skipped_at = models.DateTimeField(null=True, blank=True)
+    task = models.OneToOneField(
+        PeriodicTask,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True
+    )
+
+    def delete(self, *args, **kwargs):
+        product_ids = list(self.tracked_products.values_list('pk', flat=True))
+        if self.task is not None:
+            self.task.delete()
+        result = super(self.__class__, self).delete(*args, **kwargs)
+        delete_orphan_products(product_ids)
+        return result
+
+    @property
+    def period(self) -> TimeInterval:
+        """Shorter of price and quantity periods, task is run with this period."""
+        return min(self.price_period, self.quantity_period, key=get_period_duration)
+
+    @property
+    def interval_schedule(self):
+        return get_interval_schedule(self.period)
+
+    @property
+    def expire_seconds(self) -> int:
+        """Run that waits in queue longer than one period is dropped, so queue doesn't grow when workers are slow."""
+        return int(get_period_duration(self.period).total_seconds())
+
+    def _is_due(self, synced_at: datetime.datetime | None, period: TimeInterval, now: datetime.datetime) -> bool:
+        # half of task period is tolerated, so small delays of beat don't make field skip its turn
+        tolerance = get_period_duration(self.period) / 2
+        return synced_at is None or now - synced_at >= get_period_duration(period) - tolerance
+
+    def is_price_due(self, now: datetime.datetime) -> bool:
+        """Checks if price period has passed since last price sync."""
+        return self._is_due(self.price_synced_at, self.price_period, now)
+
+    def is_quantity_due(self, now: datetime.datetime) -> bool:
+        """Checks if quantity period has passed since last quantity sync."""
+        return self._is_due(self.quantity_synced_at, self.quantity_period, now)
+
+    def setup_task(self):
+        start_time = get_start_time(self, self.period)
+        self.task = PeriodicTask.objects.create(
+            name=f"Task-price-quantity-sync: {self.retail_address} #{SyncChecker.objects.filter(retail_address=self.retail_address).count().__str__()}",
+            task='sync_products',
+            interval=self.interval_schedule,
+            args=json.dumps([self.id]),
+            start_time=start_time,
+            last_run_at=start_time - get_period_duration(self.period),  # beat counts first run from last run time
+            expire_seconds=self.expire_seconds
+        )
+        self.save()
+
+
+class ProductSyncState(models.Model):
+    """Last price and quantity that were pushed to Zonesmart product or confirmed there."""
+    zone_product_id = models.CharField(max_length=64, unique=True)
+    last_price = models.CharField(max_length=32, null=True)
+    last_quantity = models.IntegerField(null=True)
+    price_checked_at = models.DateTimeField(null=True)  # last time price was read from Zonesmart api
+    quantity_checked_at = models.DateTimeField(null=True)  # last time quantity was read from Zonesmart api
+
+    @staticmethod
+    def _is_check_due(checked_at: datetime.datetime | None, now: datetime.datetime) -> bool:
+        interval = settings.SYNC_FULL_RECONCILE_INTERVAL
+        if checked_at is None:
+            return True
+        return interval is not None and now - checked_at >= interval
+
+    def is_price_check_due(self, now: datetime.datetime) -> bool:
+        """Checks if price has to be read from Zonesmart api instead of trusting last pushed value."""
+        return self.last_price is None or self._is_check_due(self.price_checked_at, now)
+
+    def is_quantity_check_due(self, now: datetime.datetime) -> bool:
+        """Checks if quantity has to be read from Zonesmart api instead of trusting last pushed value."""
+        return self.last_quantity is None or self._is_check_due(self.quantity_checked_at, now)
+
+
+class CatalogCursor(models.Model):
+    """Position of delta catalog fetch of RetailCRM account."""
+    account = models.CharField(max_length=64, unique=True)  # hash of RetailCRM address and api key
+    synced_at = models.DateTimeField(null=True)
+
+
+class CatalogProductState(models.Model):
+    """Fingerprint of RetailCRM product as it was returned by last delta catalog fetch."""
+    cursor = models.ForeignKey(CatalogCursor, on_delete=models.CASCADE, related_name='products')
+    listing_sku = models.CharField(max_length=64)
+    fingerprint = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ('cursor', 'listing_sku')
+
+
+class ExportJob(models.Model):
+    """Background export of all RetailCRM products to Zonesmart listings.
+
+    Products are exported page by page, next_page is the checkpoint job continues from after interruption.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = EnumChoiceField(ExportStatus, default=ExportStatus.pending)
+    retail_address = models.CharField(max_length=70, blank=False)
+    retail_api_key = models.CharField(max_length=100, blank=False)
+    access_token = models.TextField()
+    refresh_token = models.TextField()
+    quantity_sync = models.BooleanField(default=False)
+    price_sync = models.BooleanField(default=False)
+    combined_sync = models.BooleanField(default=False)
+    quantity_sync_period = EnumChoiceField(TimeInterval, null=True, blank=True)
+    price_sync_period = EnumChoiceField(TimeInterval, null=True, blank=True)
+    warehouse_id = models.CharField(max_length=64, null=True, blank=True)
+    next_page = models.PositiveIntegerField(default=1)
+    total_pages = models.PositiveIntegerField(null=True, blank=True)
+    processed_listings = models.PositiveIntegerField(default=0)
+    created_listings = models.PositiveIntegerField(default=0)
+    tracked_products = models.ManyToManyField('TrackedProduct')
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)  # time of last checkpoint
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def throughput(self) -> float | None:
+        """Listings processed per second since job was started."""
+        if self.started_at is None:
+            return None
+        seconds = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return round(self.processed_listings / seconds, 2) if seconds > 0 else None
+
+
+class ExportedListing(models.Model):
+    """Listing that was created by export job, so resumed job doesn't create it again."""
+    job = models.ForeignKey(ExportJob, on_delete=models.CASCADE, related_name='exported')
+    listing_sku = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ('job', 'listing_sku')
+
+
+class ExportFailure(models.Model):
+    """Listing that wasn't created by export job."""
+    job = models.ForeignKey(ExportJob, on_delete=models.CASCADE, related_name='failures')
+    listing_sku = models.CharField(max_length=64, null=True)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    reason = models.TextField()
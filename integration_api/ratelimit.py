@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import time
+from urllib.parse import urlparse
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from integration_api.cache import run_script
+from integration_api.jwt_utils import get_jwt_payload
+
+# Token bucket with adaptive rate. Rate is halved when upstream throttles requests and slowly recovers up to its
+# configured maximum. Returns amount of seconds caller has to wait before taking a token again, 0 if token was taken.
+ACQUIRE_SCRIPT = """
+local max_rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local recovery = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'rate', 'updated_at', 'blocked_until')
+local rate = tonumber(bucket[2]) or max_rate
+local updated_at = tonumber(bucket[3]) or now
+local blocked_until = tonumber(bucket[4]) or 0
+if blocked_until > now then
+    return tostring(blocked_until - now)
+end
+local elapsed = math.max(now - updated_at, 0)
+rate = math.min(max_rate, rate + elapsed * recovery)
+local tokens = math.min(burst, (tonumber(bucket[1]) or burst) + elapsed * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'rate', tostring(rate), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], 3600)
+return tostring(wait)
+"""
+
+# Halves rate of bucket and blocks it for given amount of seconds.
+THROTTLE_SCRIPT = """
+local min_rate = tonumber(ARGV[1])
+local delay = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate')) or tonumber(ARGV[3])
+redis.call('HSET', KEYS[1], 'rate', tostring(math.max(min_rate, rate / 2)), 'tokens', '0',
+           'updated_at', tostring(now + delay), 'blocked_until', tostring(now + delay))
+redis.call('EXPIRE', KEYS[1], 3600)
+return 'OK'
+"""
+
+
+def get_account(headers: dict | None) -> str:
+    """Returns account that request is made for. Zonesmart account is taken from user_id claim of access token,
+    RetailCRM account is identified by hash of api key.
+
+    :param headers: Request headers.
+    """
+    headers = headers or {}
+    authorization = headers.get('Authorization')
+    if authorization:
+        token = authorization.split()[-1]
+        payload = get_jwt_payload(token) or {}
+        if 'user_id' in payload:
+            return f"user:{payload['user_id']}"
+        return hashlib.sha256(token.encode()).hexdigest()
+    api_key = headers.get('X-API-KEY')
+    if api_key:
+        return hashlib.sha256(api_key.encode()).hexdigest()
+    return 'anonymous'
+
+
+class RateLimiter:
+    """Rate limiter of upstream api account shared by all workers through Redis."""
+
+    def __init__(self, host: str, account: str):
+        """
+        :param host: Upstream api host.
+        :param account: Account returned by get_account.
+        """
+        self.key = f"ratelimit:{host}:{account}"
+        self.max_rate = settings.UPSTREAM_RATE_LIMITS.get(host, settings.UPSTREAM_DEFAULT_RATE_LIMIT)
+
+    @classmethod
+    def for_request(cls, url: str, headers: dict | None) -> 'RateLimiter':
+        """Returns rate limiter of host and account of request."""
+        return cls(urlparse(url).hostname, get_account(headers))
+
+    def _take(self) -> float:
+        """Takes token from bucket.
+
+        :return: Seconds caller has to wait before trying again, 0 if token was taken or Redis is not available.
+        """
+        try:
+            return float(run_script(ACQUIRE_SCRIPT, self.key, self.max_rate, settings.UPSTREAM_RATE_LIMIT_BURST,
+                                    settings.UPSTREAM_RATE_RECOVERY))
+        except redis.RedisError:
+            return 0
+
+    def _block(self, delay: float) -> bool:
+        """Halves rate of bucket and blocks it for delay seconds.
+
+        :return: False if Redis is not available.
+        """
+        try:
+            run_script(THROTTLE_SCRIPT, self.key, settings.UPSTREAM_MIN_RATE, delay, self.max_rate)
+            return True
+        except redis.RedisError:
+            return False
+
+    def acquire(self):
+        """Blocks until request to upstream api is allowed. If Redis is not available, requests are not limited."""
+        while (wait := self._take()) > 0:
+            time.sleep(min(wait, settings.UPSTREAM_BACKOFF_MAX))
+
+    def throttle(self, delay: float):
+        """Slows down all workers using this account after upstream api throttled request.
+
+        :param delay: Seconds no requests are sent to upstream api.
+        """
+        if not self._block(delay):
+            time.sleep(delay)
+
+    async def aacquire(self):
+        """Async version of acquire, waiting doesn't block event loop."""
+        while (wait := await sync_to_async(self._take, thread_sensitive=False)()) > 0:
+            await asyncio.sleep(min(wait, settings.UPSTREAM_BACKOFF_MAX))
+
+    async def athrottle(self, delay: float):
+        """Async version of throttle.
+
+        :param delay: Seconds no requests are sent to upstream api.
+        """
+        if not await sync_to_async(self._block, thread_sensitive=False)(delay):
+            await asyncio.sleep(delay)
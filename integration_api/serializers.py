@@ -1,7 +1,12 @@
+import functools
+
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from rest_framework_dataclasses.serializers import DataclassSerializer
-from integration_api.dataclasses import ProductFilter, ZoneSmartListing, PriceQuantitySync
+from integration_api.cache import is_validation_cached, remember_validation
+from integration_api.models import ExportJob, ExportFailure
+from integration_api.dataclasses import ProductFilter, ZoneSmartListing, PriceQuantitySync, ListingExportFailure, \
+    CatalogDelta
 from integration_api.services import try_retail_login, ZoneSmartService, get_access_token
 
 
@@ -11,6 +16,13 @@ class RetailAuthInputSerializer(serializers.Serializer):
     api_key = serializers.CharField(required=True)
 
 
+class RetailWebhookInputSerializer(serializers.Serializer):
+    """Serializer of RetailCRM trigger request with offers which price or stock was changed."""
+    address = serializers.CharField(required=True)
+    api_key = serializers.CharField(required=True)
+    offer_ids = serializers.ListField(child=serializers.CharField(), allow_empty=False, max_length=1000)
+
+
 class ZsAuthInputSerializer(serializers.Serializer):
     """Zonesmart input credentials serializer."""
     email = serializers.CharField(required=True)
@@ -23,10 +35,14 @@ class ZsAccessTokenInputSerializer(serializers.Serializer):
 
     def validate(self, data):
         access = data['access']
+        if not self.context.get('fresh_check') and is_validation_cached('zonesmart_access', access):
+            return data
+
         zs_service = ZoneSmartService(access)
         access_status = zs_service.check_access_token()
         if not access_status:
             raise ValidationError({"zonesmart_auth_error": "access token is not valid!"})
+        remember_validation('zonesmart_access', access)
         return data
 
 
@@ -34,12 +50,18 @@ class ZsRefreshTokenInputSerializer(serializers.Serializer):
     refresh = serializers.CharField(required=True)
 
 
-class ZsRefreshAccessTokenInputSerializer(serializers.Serializer):
-    """Serializer that checks Zonesmart refresh and access tokens."""
+class ZsTokensInputSerializer(serializers.Serializer):
+    """Zonesmart access and refresh tokens serializer."""
     access = serializers.CharField(required=True)
     refresh = serializers.CharField(required=True)
 
+
+class ZsRefreshAccessTokenInputSerializer(ZsTokensInputSerializer):
+    """Serializer that checks Zonesmart refresh and access tokens."""
+
     def validate(self, data):
+        if not self.context.get('fresh_check') and is_validation_cached('zonesmart', data['access'], data['refresh']):
+            return data
 
         refresh = data['refresh']
         refresh_check = get_access_token(refresh)
@@ -52,7 +74,7 @@ class ZsRefreshAccessTokenInputSerializer(serializers.Serializer):
         if not access_status:
             raise ValidationError({"zonesmart_auth_error": "access token is not valid!"})
 
-
+        remember_validation('zonesmart', access, refresh)
         return data
 
 
@@ -72,9 +94,13 @@ class RetailAuthWithCheckInputSerializer(serializers.Serializer):
         """Override of the validate func to check RetailCRM credentials"""
         address = data['address']
         api_key = data['api_key']
+        if not self.context.get('fresh_check') and is_validation_cached('retail', address, api_key):
+            return data
+
         retail_login_status = try_retail_login(address, api_key)
         if not retail_login_status:
             raise ValidationError({"retail_auth_error": "Check RetailCRM Credentials!"})
+        remember_validation('retail', address, api_key)
         return data
 
 
@@ -84,17 +110,77 @@ class RetailGetProductsWithFilterInputSerializer(serializers.Serializer):
     filters = FilterInputSerializer()
 
 
+def compile_field(field: serializers.Field):
+    """Returns function that converts not None value the same way as field.to_representation does.
+
+    Fields that are generated for ZoneSmartListing get cheap converters, other fields fall back to
+    field.to_representation.
+    """
+    if type(field) is serializers.CharField:
+        return str
+    if type(field) is serializers.IntegerField:
+        return int
+    if isinstance(field, serializers.ListSerializer):
+        convert_item = compile_field(field.child)
+        return lambda value: [convert_item(item) for item in value]
+    if isinstance(field, serializers.Serializer):
+        return compile_representation(field)
+    if type(field) is serializers.ListField:
+        convert_item = compile_field(field.child)
+        return lambda value: [convert_item(item) if item is not None else None for item in value]
+    if type(field) is serializers.DictField:
+        convert_item = compile_field(field.child)
+        return lambda value: {str(key): convert_item(item) if item is not None else None for key, item in value.items()}
+    return field.to_representation
+
+
+def compile_representation(serializer: serializers.Serializer):
+    """Returns function that outputs instance the same way as serializer.to_representation does.
+
+    Serializer fields are introspected once, so the function doesn't build field instances and doesn't look up
+    field attributes for every nested object. Output is plain dict with the same keys and values.
+
+    :param serializer: Serializer which fields read attributes of instance directly.
+    :return: Function that takes instance and returns its representation.
+    """
+    fields = [(name, field.source, compile_field(field))
+              for name, field in serializer.fields.items() if not field.write_only]
+    for name, source, _ in fields:
+        if source == '*' or '.' in source:
+            raise ValueError(f"Field {name} with source {source} can't be compiled")
+
+    def to_representation(instance) -> dict:
+        data = dict()
+        for name, source, convert in fields:
+            value = getattr(instance, source)
+            data[name] = convert(value) if value is not None else None
+        return data
+
+    return to_representation
+
+
+@functools.cache
+def get_listing_representation():
+    """Returns compiled representation of ZoneSmartListing, see compile_representation."""
+    return compile_representation(DataclassSerializer(dataclass=ZoneSmartListing))
+
+
 class ZsListingSerializer(DataclassSerializer):
     """Serializer that outputs zs listing data(one instance)"""
 
     class Meta:
         dataclass = ZoneSmartListing
 
+    def to_representation(self, instance):
+        """Outputs listing with compiled representation, DataclassSerializer is too slow for big catalogs."""
+        return get_listing_representation()(instance)
+
 
 class PriceQuantitySyncInputSerializer(DataclassSerializer):
 
     class Meta:
         dataclass = PriceQuantitySync
+        extra_kwargs = {'combined_sync': {'default': False}}  # nested serializer doesn't fill dataclass defaults
 
     def validate(self, data: PriceQuantitySync):
         if data.quantity_sync is True:
@@ -129,8 +215,79 @@ class ZsListingsOutputSerializer(serializers.Serializer):
         return len(obj.listings)
 
 
+class CatalogDeltaOutputSerializer(DataclassSerializer):
+    """Serializer that outputs products that were changed since previous delta fetch."""
+    added = ZsListingSerializer(many=True)
+    changed = ZsListingSerializer(many=True)
+
+    class Meta:
+        dataclass = CatalogDelta
+
+
+class ListingExportFailureSerializer(DataclassSerializer):
+    """Serializer that outputs listing that wasn't created in Zonesmart api."""
+
+    class Meta:
+        dataclass = ListingExportFailure
+
+
 class ZsCreateAllListingsInputSerializer(serializers.Serializer):
     """Serializer that checks Zonesmart auth data(access token) and a list of listings."""
     zonesmart_auth = ZsRefreshAccessTokenInputSerializer()
     retail_auth = RetailAuthWithCheckInputSerializer()
     price_quantity_sync = PriceQuantitySyncInputSerializer()
+
+
+class ExportFailureOutputSerializer(serializers.ModelSerializer):
+    """Serializer that outputs listing that wasn't created by export job."""
+
+    class Meta:
+        model = ExportFailure
+        fields = ['listing_sku', 'status_code', 'reason']
+
+
+class ExportJobOutputSerializer(serializers.ModelSerializer):
+    """Serializer that outputs progress of export job."""
+    status = serializers.SerializerMethodField()
+    failed_listings = serializers.SerializerMethodField()
+    throughput = serializers.FloatField(read_only=True)  # listings per second
+    failures = ExportFailureOutputSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ExportJob
+        fields = ['id', 'status', 'next_page', 'total_pages', 'processed_listings', 'created_listings',
+                  'failed_listings', 'throughput', 'error', 'created_at', 'started_at', 'updated_at', 'finished_at',
+                  'failures']
+
+    def get_status(self, obj):
+        return obj.status.value
+
+    def get_failed_listings(self, obj):
+        return obj.failures.count()
+
+
+class AsyncRetailGetProductsWithFilterInputSerializer(serializers.Serializer):
+    """Serializer of RetailCRM auth data and filters for async views. Credentials are checked by view."""
+    retail_auth = RetailAuthInputSerializer()
+    filters = FilterInputSerializer()
+
+
+class AsyncZsCreateListingsInputSerializer(serializers.Serializer):
+    """Serializer of auth data and a list of listings for async views. Credentials are checked by view."""
+    zonesmart_auth = ZsTokensInputSerializer()
+    retail_auth = RetailAuthInputSerializer()
+    listings = ZsListingSerializer(many=True)
+    price_quantity_sync = PriceQuantitySyncInputSerializer()
+
+    def validate(self, data):
+        listings = data['listings']
+        if len(listings) == 0:
+            raise ValidationError({"listings": "Array is empty!"})
+        return data
+
+
+class AsyncZsCreateAllListingsInputSerializer(serializers.Serializer):
+    """Serializer of auth data and sync settings for async views. Credentials are checked by view."""
+    zonesmart_auth = ZsTokensInputSerializer()
+    retail_auth = RetailAuthInputSerializer()
+    price_quantity_sync = PriceQuantitySyncInputSerializer()
@@ -1,34 +1,105 @@
 import datetime
+import hashlib
 import json
-import requests
-import retailcrm
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
 
-from integration_api.models import QuantityChecker, PriceChecker
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from integration_api.cache import get_or_load, product_groups_key
+from integration_api.exceptions import UpstreamAuthError
+from integration_api.locks import catalog_lock, extend_catalog_lock
+from integration_api.models import QuantityChecker, PriceChecker, SyncChecker, ProductSyncState, \
+    TrackedProduct as TrackedProductModel, CatalogCursor, CatalogProductState
+from integration_api.transport import get_session, RetailClient, dumps_json
 from integration_api.dataclasses import ProductFilter, JWT, ProductConverter, ZoneSmartListing, ListingConverter, \
-    TrackedProduct, PriceQuantitySync
+    TrackedProduct, PriceQuantitySync, ListingExportFailure, InventoryUpdate, ZoneProductState, SyncStats, CatalogDelta
+
+
+def ordered_concurrent_map(func: Callable, items: Iterable, workers: int) -> Iterator:
+    """Applies func to items in a thread pool and yields results in input order.
+
+    At most workers * 2 calls are in flight at once, so results are not buffered far ahead of the consumer.
+
+    :param func: Function that is called for every item.
+    :param items: Items to process.
+    :param workers: Maximum amount of worker threads.
+    """
+    workers = max(workers, 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= workers * 2:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+def save_tracked_products(listings_of_tracked_products: list[TrackedProduct]) -> list[int]:
+    """Method that saves tracked products to database.
+
+    :return: Primary keys of saved products.
+    """
+    products = TrackedProductModel.objects.bulk_create([TrackedProductModel(**product.__dict__)
+                                                        for product in listings_of_tracked_products],
+                                                       batch_size=1000)
+    return [product.pk for product in products]
+
+
+def link_tracked_products(checker: QuantityChecker | PriceChecker | SyncChecker, product_ids: list[int]):
+    """Method that links tracked products to checker in batches."""
+    through = checker.tracked_products.through
+    checker_field = f"{checker.__class__.__name__.lower()}_id"
+    through.objects.bulk_create([through(**{checker_field: checker.pk, 'trackedproduct_id': product_id})
+                                 for product_id in product_ids],
+                                batch_size=1000)
 
 
 def create_periodic_tasks(sync_settings: PriceQuantitySync, listings_of_tracked_products: list[TrackedProduct],
                           retail_auth, access: str, refresh: str):
     """Method that creates periodic tasks depending on settings."""
-    temp_exported_products_creds = [obj.__dict__ for obj in listings_of_tracked_products]
-    json_exported_products_creds = json.dumps(temp_exported_products_creds) # need to convert array of products to json because celery cant understand complex python objects.
+    if not sync_settings.quantity_sync and not sync_settings.price_sync:
+        return
+    product_ids = save_tracked_products(listings_of_tracked_products)
+    create_checkers(sync_settings, product_ids, retail_auth, access, refresh)
+
+
+def create_checkers(sync_settings: PriceQuantitySync, product_ids: list[int], retail_auth, access: str, refresh: str):
+    """Method that creates checkers of saved tracked products depending on settings.
+
+    :param product_ids: Primary keys of tracked products returned by save_tracked_products.
+    """
+    if sync_settings.combined_sync and sync_settings.quantity_sync and sync_settings.price_sync:
+        checker = SyncChecker.objects.create(retail_address=retail_auth['address'],
+                                             retail_api_key=retail_auth['api_key'],
+                                             access_token=access,
+                                             refresh_token=refresh,
+                                             price_period=sync_settings.price_sync_period,
+                                             quantity_period=sync_settings.quantity_sync_period)
+        link_tracked_products(checker, product_ids)
+        return
 
     if sync_settings.quantity_sync:
-        QuantityChecker.objects.create(retail_address=retail_auth['address'],
-                                       retail_api_key=retail_auth['api_key'],
-                                       access_token=access,
-                                       refresh_token=refresh,
-                                       period=sync_settings.quantity_sync_period,
-                                       products=json_exported_products_creds)
+        checker = QuantityChecker.objects.create(retail_address=retail_auth['address'],
+                                                 retail_api_key=retail_auth['api_key'],
+                                                 access_token=access,
+                                                 refresh_token=refresh,
+                                                 period=sync_settings.quantity_sync_period)
+        link_tracked_products(checker, product_ids)
 
     if sync_settings.price_sync:
-        PriceChecker.objects.create(retail_address=retail_auth['address'],
-                                    retail_api_key=retail_auth['api_key'],
-                                    access_token=access,
-                                    refresh_token=refresh,
-                                    period=sync_settings.quantity_sync_period,
-                                    products=json_exported_products_creds)
+        checker = PriceChecker.objects.create(retail_address=retail_auth['address'],
+                                              retail_api_key=retail_auth['api_key'],
+                                              access_token=access,
+                                              refresh_token=refresh,
+                                              period=sync_settings.price_sync_period)
+        link_tracked_products(checker, product_ids)
 
 
 def try_retail_login(address: str, api_key: str) -> bool:
@@ -38,7 +109,7 @@ def try_retail_login(address: str, api_key: str) -> bool:
     :param api_key: RetailCRM shop api_key.
     :return: Boolean login state.
     """
-    client = retailcrm.v5(address, api_key)
+    client = RetailClient(address, api_key)
     login_state = client.product_groups({'active': '1'}).get_response()['success']
     return login_state
 
@@ -57,7 +128,7 @@ def get_zone_jwt(email: str, password: str) -> JWT | bool:
         "email": email,
         "password": password
     }
-    r = requests.post("https://api.zonesmart.com/v1/auth/jwt/create/", headers=header, json=data)
+    r = get_session().post("https://api.zonesmart.com/v1/auth/jwt/create/", headers=header, json=data)
 
     tokens = json.loads(r.text)
 
@@ -81,7 +152,7 @@ def get_access_token(refresh: str) -> str | bool:
     data = {
         "refresh": refresh
     }
-    response = requests.post("https://api.zonesmart.com/v1/auth/jwt/refresh/", headers=header, json=data)
+    response = get_session().post("https://api.zonesmart.com/v1/auth/jwt/refresh/", headers=header, json=data)
     converted_response = json.loads(response.text)
     if response.status_code == 200:
         access_token = converted_response['access']
@@ -106,26 +177,19 @@ class ZoneSmartService:
             'Authorization': 'JWT ' + self.access
         }
 
+    def _check_auth(self, response: requests.Response):
+        """Private method that raises UpstreamAuthError if Zonesmart api rejected access token."""
+        if response.status_code == 401:
+            raise UpstreamAuthError("Zonesmart api rejected access token")
+
     def check_access_token(self) -> bool:
         """Method that sends request to Zonesmart api to check access token."""
-        r = requests.get("https://api.zonesmart.com/v1/zonesmart/marketplace/", headers=self._get_request_header_auth())
+        r = get_session().get("https://api.zonesmart.com/v1/zonesmart/marketplace/", headers=self._get_request_header_auth())
         if r.status_code == 200:
             return True
         else:
             return False
 
-    def check_refresh(self, refresh: str) -> bool:
-        """Method that checks refresh token and gets new access token if refresh token is valid.
-        :param refresh: Refresh token.
-        :return: Refresh token status.
-        """
-        access = get_access_token(refresh)
-        if access is False:
-            return False
-        else:
-            self.access = access
-            return True
-
     def _create_warehouse(self) -> str:
         """Method that creates warehouse in Zonesmart api.
 
@@ -134,8 +198,8 @@ class ZoneSmartService:
         data = {
             'name': 'Export from RetailCRM at: ' + datetime.datetime.now().__str__()
         }
-        response = requests.post("https://api.zonesmart.com/v1/zonesmart/warehouse/",
-                                 headers=self._get_request_header_auth(), json=data)
+        response = get_session().post("https://api.zonesmart.com/v1/zonesmart/warehouse/",
+                                      headers=self._get_request_header_auth(), json=data)
         warehouse_id = json.loads(response.text)['id']
         return warehouse_id
 
@@ -145,95 +209,250 @@ class ZoneSmartService:
         :param warehouse_id: Warehouse id.
         :return: Setting status.
         """
-        response = requests.post(f"https://api.zonesmart.com/v1/zonesmart/warehouse/{warehouse_id}/set_default/",
-                                 headers=self._get_request_header_auth())
+        response = get_session().post(f"https://api.zonesmart.com/v1/zonesmart/warehouse/{warehouse_id}/set_default/",
+                                      headers=self._get_request_header_auth())
         if response.status_code == 200:
             return True
         else:
             return False
 
-    def get_product_price(self, listing_id: str, product_id: str) -> str:
-        """Method that gets product price from Zonesmart Api."""
-        response = requests.get(f"https://api.zonesmart.com/v1/zonesmart/listing/{listing_id}/product/{product_id}/",
-                                headers=self._get_request_header_auth())
+    def get_listing(self, listing_id: str) -> dict | None:
+        """Method that gets listing with all its products from Zonesmart Api.
+
+        :return: Listing. None if listing is not available.
+        """
+        response = get_session().get(f"https://api.zonesmart.com/v1/zonesmart/listing/{listing_id}/",
+                                     headers=self._get_request_header_auth())
+        self._check_auth(response)
         if response.status_code == 200:
-            listing = json.loads(response.text)
-            price = listing['price']
-            return price
+            return json.loads(response.text)
         else:
-            return "0"
+            return None
+
+    def get_products_state(self, json_products) -> dict[str, ZoneProductState]:
+        """Method that loads price and quantities of tracked products, fetching every listing only once.
+
+        :param json_products: Tracked products.
+        :return: Dictionary with Zonesmart product id as key and product state as value. Products of listings that
+        are not available are missing.
+        """
+        listing_ids = list(dict.fromkeys(product['zone_listing_id'] for product in json_products))
+        state = dict()
+        for listing in ordered_concurrent_map(self.get_listing, listing_ids, settings.ZONESMART_FETCH_WORKERS):
+            if listing is None:
+                continue
+            for product in listing['products']:
+                quantities = {inventory['warehouse']: inventory['quantity']
+                              for inventory in product.get('product_inventories', [])}
+                state[product['id']] = ZoneProductState(product['price'], quantities)
+        return state
 
     def update_price(self, product_id: str, listing_id: str, price: str) -> bool:
         """Method that updates price of product in Zonesmart Api."""
         data = {
             'price': price
         }
-        response = requests.patch(f"https://api.zonesmart.com/v1/zonesmart/listing/{listing_id}/product/{product_id}/",
-                                  headers=self._get_request_header_auth(),
-                                  json=data)
+        response = get_session().patch(f"https://api.zonesmart.com/v1/zonesmart/listing/{listing_id}/product/{product_id}/",
+                                       headers=self._get_request_header_auth(),
+                                       json=data)
+        self._check_auth(response)
         if response.status_code == 200:
             return True
         else:
             return False
 
-    def get_product_quantity(self, listing_id: str, product_id: str, warehouse_id: str) -> int:
-        """Method that gets quantity of product from zonesmart api."""
-        response = requests.get(f"https://api.zonesmart.com/v1/zonesmart/listing/{listing_id}/product/{product_id}/",
-                                headers=self._get_request_header_auth())
-        if response.status_code == 200:
-            listing = json.loads(response.text)
-            products_inventories = listing['product_inventories']
-            for product in products_inventories:
-                temp_warehouse_id = product['warehouse']
-                if warehouse_id == temp_warehouse_id:
-                    return product['quantity']
-        else:
-            return 0
+    def _update_inventory_chunk(self, chunk: list[InventoryUpdate]) -> list[str | None]:
+        """Private method that sends one bulk_update request.
+
+        Zonesmart validates bulk request as a whole and saves nothing if any item is invalid, so valid items of
+        rejected request are sent again without invalid ones.
 
-    def update_product_quantity(self, product_id, warehouse_id, quantity):
-        """Method that updates quantity of product in zonesmart api."""
+        :param chunk: Inventory updates, no more than ZONESMART_BULK_UPDATE_SIZE.
+        :return: Error of every item, None for updated items.
+        """
         data = {
-            'inventory': [{
-                'product': product_id,
-                'warehouse': warehouse_id,
-                'quantity': quantity
-            }]
+            'inventory': [update.__dict__ for update in chunk]
         }
-        response = requests.post("https://api.zonesmart.com/v1/zonesmart/product_inventory/bulk_update/",
-                                 headers=self._get_request_header_auth(),
-                                 json=data)
+        try:
+            response = get_session().post("https://api.zonesmart.com/v1/zonesmart/product_inventory/bulk_update/",
+                                          headers=self._get_request_header_auth(),
+                                          json=data)
+        except requests.RequestException as e:  # UpstreamUnavailable too, other chunks are still sent
+            return [str(e)] * len(chunk)
+        self._check_auth(response)
         if response.status_code == 200:
-            return True
+            return [None] * len(chunk)
+
+        item_errors = get_bulk_item_errors(response, len(chunk))
+        if item_errors is None or all(error is None for error in item_errors):
+            return [f"{response.status_code}: {response.text}"] * len(chunk)
+
+        valid_updates = [update for update, error in zip(chunk, item_errors) if error is None]
+        valid_results = iter(self._update_inventory_chunk(valid_updates) if valid_updates else [])
+        return [error if error is not None else next(valid_results) for error in item_errors]
+
+    def bulk_update_quantities(self, updates: list[InventoryUpdate]) -> list[str | None]:
+        """Method that updates quantities of many products in zonesmart api.
+
+        Updates are sent in chunks of ZONESMART_BULK_UPDATE_SIZE items per request. Failed request fails only
+        items of its chunk.
+
+        :param updates: List of inventory updates.
+        :return: Error of every item, None for updated items, in order of updates.
+        """
+        chunk_size = settings.ZONESMART_BULK_UPDATE_SIZE
+        results = list()
+        for i in range(0, len(updates), chunk_size):
+            results.extend(self._update_inventory_chunk(updates[i:i + chunk_size]))
+        return results
+
+    def _create_listing(self, listing: ZoneSmartListing) -> tuple[dict | None, ListingExportFailure | None]:
+        """Method that creates one listing in Zonesmart api.
+
+        :param listing: Zonesmart listing.
+        :return: Created listing from Zonesmart api or reason why listing wasn't created.
+        """
+        try:
+            response = get_session().post("https://api.zonesmart.com/v1/zonesmart/listing/",
+                                          headers=self._get_request_header_auth(),
+                                          data=dumps_json(listing.to_payload()))
+        except requests.RequestException as e:
+            status_code = e.response.status_code if e.response is not None else None
+            return None, ListingExportFailure(listing.listing_sku, status_code, str(e))
+
+        if response.status_code == 201:
+            return json.loads(response.text), None
         else:
-            return False
+            return None, ListingExportFailure(listing.listing_sku, response.status_code, response.text)
 
-    def create_listings(self, listings: list[ZoneSmartListing]) -> tuple[list[ZoneSmartListing], list[TrackedProduct]]:
+    def create_listings(self, listings: list[ZoneSmartListing]) -> tuple[list[ZoneSmartListing], list[TrackedProduct],
+                                                                         list[ListingExportFailure]]:
         """Method that creates listings in Zonesmart api.
 
+        Up to ZONESMART_CREATE_WORKERS listings are created concurrently, results keep order of input listings.
+
         :param listings: List of Zonesmart listings.
-        :return: List of successfully exported listings and list of products that will be used in periodic tasks.
+        :return: List of successfully exported listings, list of products that will be used in periodic tasks and list
+        of listings that weren't created.
+        """
+        warehouse_id = self.create_default_warehouse()
+        return self.create_listings_in_warehouse(listings, warehouse_id)
+
+    def create_default_warehouse(self) -> str:
+        """Method that creates warehouse for exported products and sets it as default.
+
+        :return: Created warehouse id.
         """
         warehouse_id = self._create_warehouse()
         self._set_default_warehouse(warehouse_id)
+        return warehouse_id
+
+    def create_listings_in_warehouse(self, listings: list[ZoneSmartListing], warehouse_id: str) \
+            -> tuple[list[ZoneSmartListing], list[TrackedProduct], list[ListingExportFailure]]:
+        """Method that creates listings in Zonesmart api, products of listings are tracked on given warehouse.
 
-        exported_listings = list()
-        listings_of_tracked_products = list()
-        for listing in listings:
-            json_listing = listing.to_json()
-            correct_json_listing = json.loads(json_listing)
-            response = requests.post("https://api.zonesmart.com/v1/zonesmart/listing/",
-                                     headers=self._get_request_header_auth(),
-                                     json=correct_json_listing)
-            if response.status_code == 201:
-                exported_listings.append(listing)
-                created_listing = json.loads(response.text)
-                created_listing_products = created_listing['products']
-                for product in created_listing_products:
-                    listings_of_tracked_products.append(TrackedProduct(product['sku'],
-                                                                       created_listing['id'],
-                                                                       product['id'],
-                                                                       warehouse_id))
-        return exported_listings, listings_of_tracked_products
+        :param listings: List of Zonesmart listings.
+        :param warehouse_id: Id of warehouse created by create_default_warehouse.
+        :return: Same as create_listings.
+        """
+        return collect_created_listings(self.iter_created_listings(listings), warehouse_id)
+
+    def iter_created_listings(self, listings: list[ZoneSmartListing]) -> Iterator[tuple[ZoneSmartListing, tuple]]:
+        """Method that creates listings in Zonesmart api and yields result of every listing as soon as it is ready.
+
+        Up to ZONESMART_CREATE_WORKERS listings are created concurrently, results keep order of input listings.
+
+        :param listings: List of Zonesmart listings.
+        :return: Iterator over pairs of listing and result of _create_listing call.
+        """
+        return zip(listings, ordered_concurrent_map(self._create_listing, listings, settings.ZONESMART_CREATE_WORKERS))
+
+    def create_listings_pipelined(self, listings: Iterable[ZoneSmartListing]) \
+            -> tuple[list[ZoneSmartListing], list[TrackedProduct], list[ListingExportFailure]]:
+        """Method that creates listings in Zonesmart api while listings are still being read.
+
+        Producer thread reads listings into queue of EXPORT_PIPELINE_QUEUE_SIZE listings, ZONESMART_CREATE_WORKERS
+        threads take listings from the queue and create them. Producer waits while the queue is full, so reading
+        doesn't run ahead of creating and only queued listings are kept in memory.
+
+        :param listings: Iterable of Zonesmart listings, for example RetailCRMService.iter_all_products().
+        Warehouse is created when the first listing is taken from the queue, so export of empty catalog or export
+        that fails on the first page doesn't change default warehouse of account.
+
+        :return: Same as create_listings. If reading fails, listings that were read are still created and reading
+        error is added to failed listings.
+        """
+        workers = max(settings.ZONESMART_CREATE_WORKERS, 1)
+        listings_queue = queue.Queue(maxsize=settings.EXPORT_PIPELINE_QUEUE_SIZE)
+        results = dict()  # read index as key, so results can be returned in read order
+        read_failures = list()
+        warehouse = dict()  # 'id' or 'error' once the first consumer tried to create warehouse
+        warehouse_lock = threading.Lock()
+
+        def get_warehouse_id() -> str:
+            with warehouse_lock:
+                if not warehouse:
+                    try:
+                        warehouse['id'] = self.create_default_warehouse()
+                    except Exception as e:
+                        warehouse['error'] = f"Warehouse wasn't created: {e}"
+            if 'error' in warehouse:
+                raise RuntimeError(warehouse['error'])
+            return warehouse['id']
+
+        def produce():
+            try:
+                for index, listing in enumerate(listings):
+                    listings_queue.put((index, listing))
+            except Exception as e:
+                read_failures.append(ListingExportFailure(None, None, f"Reading products failed: {e}"))
+            finally:
+                for _ in range(workers):
+                    listings_queue.put(None)  # one stop marker for every consumer
+
+        def consume():
+            while (item := listings_queue.get()) is not None:
+                index, listing = item
+                try:
+                    get_warehouse_id()
+                    results[index] = listing, self._create_listing(listing)
+                except Exception as e:  # consumer has to keep draining the queue, otherwise producer waits forever
+                    results[index] = listing, (None, ListingExportFailure(listing.listing_sku, None, str(e)))
+
+        threads = [threading.Thread(target=produce)] + [threading.Thread(target=consume) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        exported_listings, listings_of_tracked_products, failed_listings = \
+            collect_created_listings((results[index] for index in sorted(results)), warehouse.get('id'))
+        return exported_listings, listings_of_tracked_products, failed_listings + read_failures
+
+
+def collect_created_listings(results: Iterable[tuple[ZoneSmartListing, tuple]], warehouse_id: str) \
+        -> tuple[list[ZoneSmartListing], list[TrackedProduct], list[ListingExportFailure]]:
+    """Method that splits results of ZoneSmartService._create_listing calls into exported, tracked and failed listings.
+
+    :param results: Pairs of listing and result of _create_listing call.
+    :param warehouse_id: Id of warehouse listings were created on.
+    :return: Same as ZoneSmartService.create_listings.
+    """
+    exported_listings = list()
+    listings_of_tracked_products = list()
+    failed_listings = list()
+    for listing, (created_listing, failure) in results:
+        if failure is not None:
+            failed_listings.append(failure)
+            continue
+        exported_listings.append(listing)
+        created_listing_products = created_listing['products']
+        for product in created_listing_products:
+            listings_of_tracked_products.append(TrackedProduct(product['sku'],
+                                                               created_listing['id'],
+                                                               product['id'],
+                                                               warehouse_id))
+    return exported_listings, listings_of_tracked_products, failed_listings
 
 
 class RetailCRMService:
@@ -248,58 +467,81 @@ class RetailCRMService:
         """
         self.address = address
         self.api_key = api_key
-        self.client = retailcrm.v5(self.address, self.api_key)
-
-    def get_product_quantity(self, product_id: str) -> int:
-        """Method that gets product quantity from Retail Api."""
-        product_filter = {
-            'ids': [product_id]
-        }
+        self.client = RetailClient(self.address, self.api_key)
 
-        total_count = self.client.inventories(product_filter).get_response()['pagination']['totalCount']
+    def get_products_quantities(self, product_ids: list[str]) -> dict[str, int]:
+        """Method that gets quantities of many products from Retail Api.
 
-        if total_count != 0:
-            offers_query = self.client.inventories(product_filter, 20, 1).get_response()
-            offer = offers_query['offers']
-            quantity = offer[0]['quantity']
-            return quantity
-        else:
-            return 0
-
-    def get_offer_price(self, offer_id: str) -> str:
-        """Method that gets offer price from retail api.
+        Ids are requested in chunks of RETAILCRM_INVENTORIES_PAGE_SIZE, so every chunk fits into one page.
 
-        :return: Offer price. If offer is deleted from retail api, returns "0".
+        :param product_ids: List of RetailCRM offer ids.
+        :return: Dictionary with offer id as key and quantity as value. Products that are missing in Retail Api have
+        quantity 0.
         """
-        product_filter = {
-            'offerIds': [offer_id]
-        }
-        total_count = self.client.products(product_filter).get_response()['pagination']['totalCount']
-        if total_count != 0:
-            total_page_count = self.client.products(product_filter).get_response()['pagination']['totalPageCount']
-            for i in range(1, total_page_count + 1):
-                products_query = self.client.products(product_filter, 20, i).get_response()['products']
-
-                for product in products_query:
-                    for offer in product['offers']:
-                        price = offer['prices'][0]['price']
-                        return price
-        else:
-            return "0"
+        chunk_size = settings.RETAILCRM_INVENTORIES_PAGE_SIZE
+        chunks = [product_ids[i:i + chunk_size] for i in range(0, len(product_ids), chunk_size)]
+
+        def fetch_chunk(chunk: list[str]) -> list[dict]:
+            offers = []
+            for page in self._iter_pages('inventories', {'ids': chunk}, chunk_size):
+                offers.extend(page['offers'])
+            return offers
+
+        quantities = {str(product_id): 0 for product_id in product_ids}
+        for offers in ordered_concurrent_map(fetch_chunk, chunks, settings.RETAILCRM_FETCH_WORKERS):
+            for offer in offers:
+                quantities[str(offer['id'])] = offer['quantity']
+        return quantities
+
+    def get_offers_prices(self, offer_ids: list[str]) -> dict[str, str]:
+        """Method that gets prices of many offers from retail api.
+
+        Offers are requested in chunks of RETAILCRM_PAGE_SIZE ids, so amount of requests depends on amount of pages
+        and not on amount of offers.
+
+        :param offer_ids: List of RetailCRM offer ids.
+        :return: Dictionary with offer id as key and price as value. If offer is deleted from retail api, its price
+        is "0".
+        """
+        chunk_size = settings.RETAILCRM_PAGE_SIZE
+        chunks = [offer_ids[i:i + chunk_size] for i in range(0, len(offer_ids), chunk_size)]
+
+        def fetch_chunk(chunk: list[str]) -> list[dict]:
+            products = []
+            for page in self._iter_pages('products', {'offerIds': chunk}):
+                products.extend(page['products'])
+            return products
+
+        prices = {str(offer_id): "0" for offer_id in offer_ids}
+        for products in ordered_concurrent_map(fetch_chunk, chunks, settings.RETAILCRM_FETCH_WORKERS):
+            for product in products:
+                for offer in product['offers']:
+                    offer_id = str(offer['id'])
+                    if offer_id in prices:
+                        prices[offer_id] = offer['prices'][0]['price']
+        return prices
 
     def get_product_groups(self) -> dict[str, str]:
         """Method that gets product groups from RetailCRM Api.
 
+        Groups are cached for RETAILCRM_GROUPS_CACHE_TTL seconds and shared between workers.
+
+        :return: Dictionary with product groups. Id as key, name as value.
+        """
+        return get_or_load(product_groups_key(self.address), self._fetch_product_groups,
+                           settings.RETAILCRM_GROUPS_CACHE_TTL)
+
+    def _fetch_product_groups(self) -> dict[str, str]:
+        """Method that fetches product groups from RetailCRM Api bypassing cache.
+
         :return: Dictionary with product groups. Id as key, name as value.
         """
         groups = dict()
 
         groups_filter = {}
 
-        total_page_count = self.client.product_groups(groups_filter).get_response()['pagination']['totalPageCount']
-        for i in range(1, total_page_count + 1):
-            group_query = self.client.product_groups(groups_filter, 20, i).get_response()['productGroup']
-            for group in group_query:
+        for page in self._iter_pages('product_groups', groups_filter):
+            for group in page['productGroup']:
                 groups[group['id']] = group['name']
 
         return groups
@@ -319,45 +561,90 @@ class RetailCRMService:
             product_filter['groups'] = p_filter.groups
         return product_filter
 
+    def _fetch_page(self, method: str, p_filter: dict, page: int, limit: int | None = None) -> dict:
+        """Method that fetches one page of paginated RetailCRM method.
+
+        Every call uses its own client, because retailcrm client keeps request parameters between calls and can't be
+        shared between threads.
+
+        :param method: Name of retailcrm client method, for example 'products'.
+        :param p_filter: Filter converted by function _convert_filter.
+        :param page: Page number.
+        :param limit: Page size. RETAILCRM_PAGE_SIZE by default.
+        :return: RetailCRM response body.
+        """
+        client = RetailClient(self.address, self.api_key)
+        response = getattr(client, method)(p_filter, limit or settings.RETAILCRM_PAGE_SIZE, page)
+        if response.get_status_code() in (401, 403):  # RetailCRM answers 403 to wrong api key
+            raise UpstreamAuthError("RetailCRM api rejected api key")
+        return response.get_response()
+
+    def _iter_pages(self, method: str, p_filter: dict, limit: int | None = None, start_page: int = 1) -> Iterator[dict]:
+        """Method that walks through all pages of paginated RetailCRM method.
+
+        Pagination metadata is taken from the first page, the rest of pages are fetched concurrently and returned
+        in page order.
+
+        :param method: Name of retailcrm client method, for example 'products'.
+        :param p_filter: Filter converted by function _convert_filter.
+        :param limit: Page size. RETAILCRM_PAGE_SIZE by default.
+        :param start_page: Number of the first page to fetch.
+        :return: Iterator over response bodies of every page.
+        """
+        first_page = self._fetch_page(method, p_filter, start_page, limit)
+        yield first_page
+
+        total_page_count = first_page['pagination']['totalPageCount']
+        yield from ordered_concurrent_map(lambda page: self._fetch_page(method, p_filter, page, limit),
+                                          range(start_page + 1, total_page_count + 1),
+                                          settings.RETAILCRM_FETCH_WORKERS)
+
+    def _convert_product(self, product: dict, groups: dict[str, str]) -> ZoneSmartListing:
+        """Method that converts RetailCRM product to ZoneSmart listing.
+
+        :param product: Product from RetailCRM api.
+        :param groups: Product groups dictionary returned by get_product_groups.
+        :return: ZoneSmart listing.
+        """
+        offers = []
+        images = None
+        for offer in product['offers']:
+            images = offer.get('images')
+            product_converter = ProductConverter(offer.get('id'),
+                                                 offer.get('quantity'),
+                                                 offer.get('price'),
+                                                 offer.get('barcode'),
+                                                 offer.get('properties'))
+            new_offer = product_converter.get_zonesmart_product()
+            offers.append(new_offer)
+        listing_converter = ListingConverter(product.get('name'),
+                                             product.get('description'),
+                                             product.get('id'),
+                                             groups.get(product['groups'][0]['id']),
+                                             product.get('manufacturer'),
+                                             offers,
+                                             product.get('imageUrl'),
+                                             images)
+        return listing_converter.get_zonesmart_listing()
+
+    def _iter_products(self, product_filter: dict) -> Iterator[ZoneSmartListing]:
+        """Method that yields products from RetailCRM api page by page.
+
+        :param product_filter: Product filter converted by function _convert_filter.
+        :return: Iterator over ZoneSmart listings.
+        """
+        groups = self.get_product_groups()
+        for page in self._iter_pages('products', product_filter):
+            for product in page['products']:
+                yield self._convert_product(product, groups)
+
     def _fetch_products(self, product_filter: dict) -> list[ZoneSmartListing]:
         """Method that fetches products from RetailCRM api.
 
         :param product_filter: Product filter converted by function _convert_filter.
         :return: List of ZoneSmart listings. If no products available in Retail api, returns empty list.
         """
-        groups = self.get_product_groups()
-        products = []
-        total_count = self.client.products(product_filter).get_response()['pagination']['totalCount']
-
-        if total_count != 0:
-            total_page_count = self.client.products(product_filter).get_response()['pagination']['totalPageCount']
-
-            for i in range(1, total_page_count + 1):
-                products_query = self.client.products(product_filter, 20, i).get_response()['products']
-
-                for product in products_query:
-                    offers = []
-                    images = None
-                    for offer in product['offers']:
-                        images = offer.get('images')
-                        product_converter = ProductConverter(offer.get('id'),
-                                                             offer.get('quantity'),
-                                                             offer.get('price'),
-                                                             offer.get('barcode'),
-                                                             offer.get('properties'))
-                        new_offer = product_converter.get_zonesmart_product()
-                        offers.append(new_offer)
-                    listing_converter = ListingConverter(product.get('name'),
-                                                         product.get('description'),
-                                                         product.get('id'),
-                                                         groups.get(product['groups'][0]['id']),
-                                                         product.get('manufacturer'),
-                                                         offers,
-                                                         product.get('imageUrl'),
-                                                         images)
-                    new_listing = listing_converter.get_zonesmart_listing()
-                    products.append(new_listing)
-        return products
+        return list(self._iter_products(product_filter))
 
     def get_all_products(self) -> list[ZoneSmartListing]:
         """Method that returns all products from RetailCRM api.
@@ -367,6 +654,24 @@ class RetailCRMService:
 
         return self._fetch_products(product_filter)
 
+    def iter_all_products(self) -> Iterator[ZoneSmartListing]:
+        """Method that lazily yields all products from RetailCRM api without keeping whole catalog in memory."""
+        product_filter = {}
+
+        return self._iter_products(product_filter)
+
+    def iter_product_pages(self, start_page: int = 1) -> Iterator[tuple[int, int, list[ZoneSmartListing]]]:
+        """Method that yields all products from RetailCRM api page by page, so caller can continue from any page.
+
+        :param start_page: Number of the first page to fetch.
+        :return: Iterator over page number, total amount of pages and products of page.
+        """
+        groups = self.get_product_groups()
+        for page in self._iter_pages('products', {}, start_page=start_page):
+            pagination = page['pagination']
+            yield pagination['currentPage'], pagination['totalPageCount'], \
+                [self._convert_product(product, groups) for product in page['products']]
+
     def get_products_with_filters(self, p_filter: ProductFilter) -> list[ZoneSmartListing]:
         """Method that returns products from Retail Api depending of filters.
 
@@ -377,31 +682,254 @@ class RetailCRMService:
         product_filter = self._convert_filter(p_filter)
         return self._fetch_products(product_filter)
 
+    def iter_products_with_filters(self, p_filter: ProductFilter) -> Iterator[ZoneSmartListing]:
+        """Method that lazily yields products from Retail Api depending of filters.
+
+        :param p_filter: Instance of class Product filter.
+        """
+        product_filter = self._convert_filter(p_filter)
+        return self._iter_products(product_filter)
+
+    def get_products_delta(self) -> CatalogDelta:
+        """Method that returns products that were added, changed or removed since previous call for this account.
+
+        Changes are detected locally: RetailCRM api has no filter of products changed since given time, so whole
+        catalog is read and every product is compared with its fingerprint saved by previous call. First call returns
+        whole catalog as added.
+
+        Concurrent calls for the same account run one after another under Redis lock, so they don't report the same
+        changes twice. Catalog is fetched outside of database transaction, only moving of the cursor is atomic.
+
+        :return: Added and changed products(converted to ZoneSmart format) and skus of removed products.
+        """
+        account = get_catalog_account(self.address, self.api_key)
+        with catalog_lock(account) as token:
+            cursor, _ = CatalogCursor.objects.get_or_create(account=account)
+            return self._diff_catalog(cursor, lambda: extend_catalog_lock(account, token))
+
+    def _diff_catalog(self, cursor: CatalogCursor, keep_lock: Callable[[], None]) -> CatalogDelta:
+        """Private method that compares catalog with fingerprints of cursor and moves cursor to catalog.
+
+        :param cursor: Delta catalog cursor of account, its lock is held by caller.
+        :param keep_lock: Function that extends lock of cursor, it is called after every page of catalog.
+        """
+        started_at = timezone.now()
+        known = dict(cursor.products.values_list('listing_sku', 'fingerprint'))
+
+        delta = CatalogDelta(list(), list(), list())
+        fingerprints = dict()
+        for _, _, listings in self.iter_product_pages():
+            for listing in listings:
+                listing_sku = str(listing.listing_sku)
+                fingerprints[listing_sku] = get_listing_fingerprint(listing)
+                if listing_sku not in known:
+                    delta.added.append(listing)
+                elif known[listing_sku] != fingerprints[listing_sku]:
+                    delta.changed.append(listing)
+            keep_lock()
+        delta.removed = [listing_sku for listing_sku in known if listing_sku not in fingerprints]
+
+        save_catalog_cursor(cursor, known, fingerprints, started_at)
+        return delta
+
+
+def get_bulk_item_errors(response: requests.Response, item_count: int) -> list[str | None] | None:
+    """Returns errors of every item from response of rejected Zonesmart bulk request.
+
+    Validation errors of bulk request are list with error of every item in order of request items, valid items
+    have empty error. List can be put under request field name.
+
+    :param item_count: Number of items in request.
+    :return: Error of every item, None for valid items. None if response doesn't have errors of items.
+    """
+    try:
+        body = response.json()
+    except ValueError:
+        return None
+    if isinstance(body, dict) and len(body) == 1:
+        body = next(iter(body.values()))
+    if not isinstance(body, list) or len(body) != item_count:
+        return None
+    return [json.dumps(error, ensure_ascii=False) if error else None for error in body]
+
+
+def get_catalog_account(address: str, api_key: str) -> str:
+    """Returns account of delta catalog fetch, that is hash of RetailCRM address and api key."""
+    return hashlib.sha256(f"{address.rstrip('/')}\0{api_key}".encode()).hexdigest()
+
+
+def get_listing_fingerprint(listing: ZoneSmartListing) -> str:
+    """Returns hash of listing content that changes when any field of listing or its products changes."""
+    return hashlib.sha256(json.dumps(listing.to_payload(), sort_keys=True).encode()).hexdigest()
+
+
+def save_catalog_cursor(cursor: CatalogCursor, known: dict[str, str], fingerprints: dict[str, str],
+                        synced_at: datetime.datetime):
+    """Method that moves delta catalog cursor to fetched catalog. Only changed fingerprints are written.
+
+    :param known: Fingerprints saved by previous fetch, listing sku as key.
+    :param fingerprints: Fingerprints of fetched catalog, listing sku as key.
+    :param synced_at: Time fetch was started at.
+    """
+    outdated = [listing_sku for listing_sku, fingerprint in known.items()
+                if fingerprints.get(listing_sku) != fingerprint]
+    fresh = [CatalogProductState(cursor=cursor, listing_sku=listing_sku, fingerprint=fingerprint)
+             for listing_sku, fingerprint in fingerprints.items() if known.get(listing_sku) != fingerprint]
+    with transaction.atomic():
+        for i in range(0, len(outdated), 1000):
+            cursor.products.filter(listing_sku__in=outdated[i:i + 1000]).delete()
+        CatalogProductState.objects.bulk_create(fresh, batch_size=1000, ignore_conflicts=True)
+        cursor.synced_at = synced_at
+        cursor.save(update_fields=['synced_at'])
+
+
+class ZoneStateLoader:
+    """Class that loads state of products from Zonesmart api, fetching every listing at most once per sync run."""
+
+    def __init__(self, zonesmart_service: ZoneSmartService):
+        """
+        :param zonesmart_service: Zonesmart service.
+        """
+        self.zonesmart_service = zonesmart_service
+        self.state = dict()
+        self._loaded_listings = set()
+
+    def load(self, json_products) -> dict[str, ZoneProductState]:
+        """Method that loads listings of products that weren't loaded yet.
+
+        :param json_products: Tracked products.
+        :return: Dictionary with Zonesmart product id as key and product state as value.
+        """
+        missing_products = [product for product in json_products
+                            if product['zone_listing_id'] not in self._loaded_listings]
+        self.state.update(self.zonesmart_service.get_products_state(missing_products))
+        self._loaded_listings.update(product['zone_listing_id'] for product in missing_products)
+        return self.state
+
+
+def get_sync_states(json_products) -> dict[str, ProductSyncState]:
+    """Method that returns sync state of every tracked product. Missing states are created, but not saved.
+
+    :return: Dictionary with Zonesmart product id as key and sync state as value.
+    """
+    product_ids = [product['zone_product_id'] for product in json_products]
+    states = {state.zone_product_id: state
+              for state in ProductSyncState.objects.filter(zone_product_id__in=product_ids)}
+    for product_id in product_ids:
+        if product_id not in states:
+            states[product_id] = ProductSyncState(zone_product_id=product_id)
+    return states
+
+
+def save_sync_states(states: dict[str, ProductSyncState], fields: list[str]):
+    """Method that saves sync states in two queries.
+
+    :param states: Sync states returned by get_sync_states.
+    :param fields: Fields that were changed.
+    """
+    ProductSyncState.objects.bulk_update([state for state in states.values() if state.pk is not None], fields,
+                                         batch_size=1000)
+    ProductSyncState.objects.bulk_create([state for state in states.values() if state.pk is None], batch_size=1000,
+                                         ignore_conflicts=True)
+
+
+def compare_and_update_prices(json_products, retail_service: RetailCRMService, zonesmart_service: ZoneSmartService,
+                              zone_state: ZoneStateLoader | None = None) -> SyncStats:
+    """Method that compares prices of product in retail api and listing in zonesmart api and if prices are different updates price in zonesmart api.
+
+    Zonesmart api is touched only for products whose retail price differs from last pushed price. Other products are
+    compared with Zonesmart api once in SYNC_FULL_RECONCILE_INTERVAL.
+
+    :param zone_state: Loader of products state in zonesmart api that can be shared with other comparisons.
+    :return: Amount of compared, updated and not updated products.
+    """
+    if zone_state is None:
+        zone_state = ZoneStateLoader(zonesmart_service)
+    stats = SyncStats(products=len(json_products))
+    now = timezone.now()
+    retail_prices = retail_service.get_offers_prices([product['retail_id'] for product in json_products])
+    sync_states = get_sync_states(json_products)
+    products_to_check = [product for product in json_products
+                         if sync_states[product['zone_product_id']].is_price_check_due(now)]
+    zone_products = zone_state.load(products_to_check) if products_to_check else {}
+    checked_ids = {product['zone_product_id'] for product in products_to_check}
 
-def compare_and_update_prices(json_products, retail_service: RetailCRMService, zonesmart_service: ZoneSmartService):
-    """Method that compares prices of product in retail api and listing in zonesmart api and if prices are different updates price in zonesmart api."""
     for product in json_products:
-        retail_price = retail_service.get_offer_price(product['retail_id'])
-        zone_price = zonesmart_service.get_product_price(product['zone_listing_id'],
-                                                         product['zone_product_id'])
+        retail_price = retail_prices[str(product['retail_id'])]
+        sync_state = sync_states[product['zone_product_id']]
+        if product['zone_product_id'] in checked_ids:
+            product_state = zone_products.get(product['zone_product_id'])
+            zone_price = product_state.price if product_state is not None else "0"
+        elif str(retail_price) == sync_state.last_price:
+            continue
+        else:
+            zone_price = sync_state.last_price
+
         if retail_price != zone_price:
             if zonesmart_service.update_price(product['zone_product_id'], product['zone_listing_id'], retail_price):
                 print("Successfully updated price")
+                stats.updated += 1
             else:
                 print("Price wasn't updated")
+                stats.failed += 1
+                continue
+        sync_state.last_price = str(retail_price)
+        if product['zone_product_id'] in checked_ids:
+            sync_state.price_checked_at = now
+
+    save_sync_states(sync_states, ['last_price', 'price_checked_at'])
+    return stats
 
 
-def compare_and_update_quantity(json_products, retail_service: RetailCRMService, zonesmart_service: ZoneSmartService):
-    """Method that compares quantity of product in retail api and listing in zonesmart api and if prices are different updates price in zonesmart api."""
+def compare_and_update_quantity(json_products, retail_service: RetailCRMService, zonesmart_service: ZoneSmartService,
+                                zone_state: ZoneStateLoader | None = None) -> SyncStats:
+    """Method that compares quantity of product in retail api and listing in zonesmart api and if prices are different updates price in zonesmart api.
+
+    Zonesmart api is touched only for products whose retail quantity differs from last pushed quantity. Other
+    products are compared with Zonesmart api once in SYNC_FULL_RECONCILE_INTERVAL.
+
+    :param zone_state: Loader of products state in zonesmart api that can be shared with other comparisons.
+    :return: Amount of compared, updated and not updated products.
+    """
+    if zone_state is None:
+        zone_state = ZoneStateLoader(zonesmart_service)
+    stats = SyncStats(products=len(json_products))
+    now = timezone.now()
+    retail_quantities = retail_service.get_products_quantities([product['retail_id'] for product in json_products])
+    sync_states = get_sync_states(json_products)
+    products_to_check = [product for product in json_products
+                         if sync_states[product['zone_product_id']].is_quantity_check_due(now)]
+    zone_products = zone_state.load(products_to_check) if products_to_check else {}
+    checked_ids = {product['zone_product_id'] for product in products_to_check}
+
+    updates = list()
     for product in json_products:
-        retail_quantity = retail_service.get_product_quantity(product['retail_id'])
-        zone_quantity = zonesmart_service.get_product_quantity(product['zone_listing_id'],
-                                                               product['zone_product_id'],
-                                                               product['warehouse_id'])
+        retail_quantity = retail_quantities[str(product['retail_id'])]
+        sync_state = sync_states[product['zone_product_id']]
+        if product['zone_product_id'] in checked_ids:
+            product_state = zone_products.get(product['zone_product_id'])
+            zone_quantity = product_state.quantities.get(product['warehouse_id']) if product_state is not None else 0
+            sync_state.quantity_checked_at = now
+        elif retail_quantity == sync_state.last_quantity:
+            continue
+        else:
+            zone_quantity = sync_state.last_quantity
+
         if retail_quantity != zone_quantity:
-            if zonesmart_service.update_product_quantity(product['zone_product_id'],
-                                                         product['warehouse_id'],
-                                                         retail_quantity):
-                print("Successfully updated quantity")
-            else:
-                print("Quantity wasn't updated")
\ No newline at end of file
+            updates.append(InventoryUpdate(product['zone_product_id'], product['warehouse_id'], retail_quantity))
+        else:
+            sync_state.last_quantity = retail_quantity
+
+    for update, error in zip(updates, zonesmart_service.bulk_update_quantities(updates)):
+        sync_state = sync_states[update.product]
+        if error is None:
+            sync_state.last_quantity = update.quantity
+            print(f"Successfully updated quantity of {update.product}")
+            stats.updated += 1
+        else:
+            sync_state.quantity_checked_at = None  # quantity in zonesmart api is unknown, it is read again next run
+            print(f"Quantity of {update.product} wasn't updated: {error}")
+            stats.failed += 1
+
+    save_sync_states(sync_states, ['last_quantity', 'quantity_checked_at'])
+    return stats
@@ -0,0 +1,109 @@
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from integration_api.cache import get_redis, run_script, RELEASE_SCRIPT
+from integration_api.jwt_utils import get_jwt_payload
+from integration_api.models import QuantityChecker, PriceChecker, SyncChecker
+from integration_api.services import get_access_token
+
+
+def get_jwt_expiry(token: str) -> int | None:
+    """Returns exp claim of JWT without verifying its signature.
+
+    :param token: JWT.
+    :return: Expiry unix timestamp. None if token can't be decoded.
+    """
+    payload = get_jwt_payload(token)
+    try:
+        return int(payload['exp'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class ZoneSmartTokenManager:
+    """Class that keeps Zonesmart access token of account fresh.
+
+    Current access token is shared between workers through Redis, and only one worker at a time refreshes it. Refresh
+    lock is released only by its owner, so worker whose lock expired during slow refresh doesn't release lock of
+    another worker.
+    """
+
+    def __init__(self, access: str, refresh: str):
+        """
+        :param access: Zonesmart api access token.
+        :param refresh: Zonesmart api refresh token.
+        """
+        self.access = access
+        self.refresh = refresh
+        account_hash = hashlib.sha256(refresh.encode()).hexdigest()
+        self._key = f"zs_access_token:{account_hash}"
+        self._lock_key = cache.make_key(f"{self._key}:lock")  # raw Redis key, so lock can be released by its owner
+
+    def _is_fresh(self, token: str | None) -> bool:
+        """Checks if token is valid for more than ZONESMART_TOKEN_REFRESH_MARGIN seconds."""
+        if not token:
+            return False
+        expiry = get_jwt_expiry(token)
+        return expiry is not None and expiry - settings.ZONESMART_TOKEN_REFRESH_MARGIN > time.time()
+
+    def get_access(self) -> str | bool:
+        """Method that returns access token, refreshing it only if it is about to expire.
+
+        :return: Access token. False if refresh token is not valid.
+        """
+        for token in (cache.get(self._key), self.access):
+            if self._is_fresh(token):
+                self.access = token
+                return token
+        return self.refresh_access()
+
+    def refresh_access(self, force: bool = False) -> str | bool:
+        """Method that gets new access token from Zonesmart api and shares it with other workers.
+
+        :param force: Refresh token even if current one is not expired, for example if Zonesmart api rejected it.
+        :return: New access token. False if refresh token is not valid.
+        """
+        rejected = self.access if force else None
+        lock_timeout = settings.CACHE_REFRESH_LOCK_TIMEOUT
+        owner = uuid.uuid4().hex
+        deadline = time.monotonic() + lock_timeout
+        while not get_redis().set(self._lock_key, owner, nx=True, ex=lock_timeout):
+            time.sleep(0.1)
+            token = cache.get(self._key)
+            if token != rejected and self._is_fresh(token):
+                self.access = token
+                return token
+            if time.monotonic() > deadline:
+                return self._fetch_access()
+
+        try:
+            token = cache.get(self._key)
+            if token != rejected and self._is_fresh(token):  # other worker could refresh token before lock was taken
+                self.access = token
+                return token
+            return self._fetch_access()
+        finally:
+            run_script(RELEASE_SCRIPT, self._lock_key, owner)
+
+    def _fetch_access(self) -> str | bool:
+        """Method that gets new access token from Zonesmart api, shares it through Redis and saves it to checkers.
+
+        :return: New access token. False if refresh token is not valid.
+        """
+        access = get_access_token(self.refresh)
+        if access is False:
+            cache.delete(self._key)
+            return False
+
+        expiry = get_jwt_expiry(access)
+        if expiry is not None:
+            cache.set(self._key, access, max(int(expiry - time.time()), 1))
+        self.access = access
+        QuantityChecker.objects.filter(refresh_token=self.refresh).update(access_token=access)
+        PriceChecker.objects.filter(refresh_token=self.refresh).update(access_token=access)
+        SyncChecker.objects.filter(refresh_token=self.refresh).update(access_token=access)
+        return access
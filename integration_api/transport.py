@@ -0,0 +1,176 @@
+import asyncio
+import http.cookiejar
+import json
+import os
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+import retailcrm
+from django.conf import settings
+from multidimensional_urlencode import urlencode as query_builder
+from requests.adapters import HTTPAdapter
+from retailcrm.response import Response
+
+from integration_api.exceptions import UpstreamUnavailable
+from integration_api.ratelimit import RateLimiter
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, standard json module is used without it
+    orjson = None
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+THROTTLE_STATUSES = (429, 503)  # request wasn't processed, so it is safe to repeat it with any method
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'PATCH', 'DELETE')
+
+
+def dumps_json(payload) -> bytes:
+    """Encodes request body to UTF-8 JSON with orjson if it is installed.
+
+    :param payload: Plain dicts, lists, strings and numbers, for example ZoneSmartListing.to_payload().
+    :return: Request body that is sent as is.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def get_retry_after(response: requests.Response | httpx.Response) -> float | None:
+    """Returns delay from Retry-After header in seconds. None if header is missing or is not a number."""
+    try:
+        return max(float(response.headers['Retry-After']), 0)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class PooledSession(requests.Session):
+    """Session with connection pool, default connect/read timeouts and per account rate limiting.
+
+    Throttled requests(429, 503) are repeated with backoff, other server errors are repeated only for idempotent
+    methods. If upstream api still answers with one of these statuses, UpstreamUnavailable is raised, so callers
+    never take throttling for data. Cookies are never stored, so cookies of one account aren't sent with requests of
+    another account.
+    """
+
+    def __init__(self):
+        super().__init__()
+        adapter = HTTPAdapter(pool_connections=settings.HTTP_POOL_CONNECTIONS,
+                              pool_maxsize=settings.HTTP_POOL_MAXSIZE)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        self.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        if not settings.HTTP_KEEP_ALIVE:
+            self.headers['Connection'] = 'close'
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT))
+        limiter = RateLimiter.for_request(url, kwargs.get('headers'))
+        for attempt in range(settings.UPSTREAM_MAX_RETRIES + 1):
+            limiter.acquire()
+            response = super().request(method, url, **kwargs)
+            backoff = min(settings.UPSTREAM_BACKOFF_BASE * 2 ** attempt, settings.UPSTREAM_BACKOFF_MAX)
+            if response.status_code in THROTTLE_STATUSES:
+                retry_after = get_retry_after(response)
+                limiter.throttle(retry_after if retry_after is not None else backoff)
+            elif response.status_code >= 500 and method.upper() in IDEMPOTENT_METHODS:
+                time.sleep(backoff)
+            elif response.status_code >= 500:
+                break
+            else:
+                return response
+        raise UpstreamUnavailable(f"{method} {url} answered with {response.status_code}", response=response)
+
+
+def get_session() -> PooledSession:
+    """Returns session shared by all threads of current process.
+
+    Session is created again after fork, so Celery prefork workers never share sockets with parent process.
+    Connection pool of the session is thread-safe. Session is shared by all accounts, so it doesn't store cookies,
+    authentication is sent in headers of every request.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = PooledSession()
+                _session_pid = pid
+    return _session
+
+
+class AsyncPooledClient(httpx.AsyncClient):
+    """Async client with the same connection pool limits, timeouts, rate limiting and retries as PooledSession."""
+
+    def __init__(self):
+        max_connections = settings.HTTP_POOL_CONNECTIONS * settings.HTTP_POOL_MAXSIZE  # pool per host in PooledSession
+        keepalive_connections = settings.HTTP_POOL_MAXSIZE if settings.HTTP_KEEP_ALIVE else 0
+        super().__init__(limits=httpx.Limits(max_connections=max_connections,
+                                             max_keepalive_connections=keepalive_connections),
+                         timeout=httpx.Timeout(settings.HTTP_READ_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT))
+
+    async def request(self, method, url, **kwargs):
+        limiter = RateLimiter.for_request(str(url), kwargs.get('headers'))
+        for attempt in range(settings.UPSTREAM_MAX_RETRIES + 1):
+            await limiter.aacquire()
+            response = await super().request(method, url, **kwargs)
+            backoff = min(settings.UPSTREAM_BACKOFF_BASE * 2 ** attempt, settings.UPSTREAM_BACKOFF_MAX)
+            if response.status_code in THROTTLE_STATUSES:
+                retry_after = get_retry_after(response)
+                await limiter.athrottle(retry_after if retry_after is not None else backoff)
+            elif response.status_code >= 500 and method.upper() in IDEMPOTENT_METHODS:
+                await asyncio.sleep(backoff)
+            elif response.status_code >= 500:
+                break
+            else:
+                return response
+        raise UpstreamUnavailable(f"{method} {url} answered with {response.status_code}", response=response)
+
+
+def get_async_client() -> AsyncPooledClient:
+    """Returns client shared by all coroutines of current event loop.
+
+    Connections of httpx client belong to event loop they were opened in, so every loop gets its own client. Client
+    of loop that is going to be discarded has to be closed with close_async_client.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncPooledClient()
+    return client
+
+
+async def close_async_client():
+    """Closes client of current event loop and its connections.
+
+    Under WSGI every async view runs in a new event loop, client of that loop would keep its sockets open and would
+    never be freed, because client references its loop.
+    """
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+class RetailClient(retailcrm.v5):
+    """RetailCRM api client that sends requests through shared pooled session."""
+
+    def get(self, url, version=True):
+        base_url = self.api_url + '/' + self.api_version if version else self.api_url
+        requests_url = base_url + url if not self.parameters else base_url + url + "?" + query_builder(self.parameters)
+        self.parameters = {}
+        response = get_session().get(requests_url, headers={'X-API-KEY': self.api_key})
+        return Response(response.status_code, response.json())
+
+    def post(self, url, version=True):
+        base_url = self.api_url + '/' + self.api_version if version else self.api_url
+        requests_url = base_url + url
+        parameters = self.parameters
+        self.parameters = {}
+        response = get_session().post(requests_url, data=parameters, headers={'X-API-KEY': self.api_key})
+        return Response(response.status_code, response.json())
@@ -1,15 +1,31 @@
 from django.urls import path
 
+from integration_api import async_views
 from integration_api.views import RetailCRMLogin, ZsLogin, RetailProductGroups, RetailProductsWithFilter, \
-    RetailAllProducts, ZsRefresh, ZsCreateListings, ZsCreateAllListings
+    RetailAllProducts, ZsRefresh, ZsCreateListings, ZsCreateAllListings, RetailInvalidateProductGroups, \
+    RetailWebhook, RetailChangedProducts, ZsExportJobStatus, ZsResumeExportJob
 
 urlpatterns = [
     path('retail_login', RetailCRMLogin.as_view()),
     path('zs_login', ZsLogin.as_view()),
     path('retail_get_product_groups', RetailProductGroups.as_view(),),
+    path('retail_invalidate_product_groups', RetailInvalidateProductGroups.as_view()),
     path('retail_get_products', RetailProductsWithFilter.as_view()),
     path('retail_get_all_products', RetailAllProducts.as_view()),
+    path('retail_get_changed_products', RetailChangedProducts.as_view()),
     path('zs_refresh', ZsRefresh.as_view()),
     path('zs_create_listings', ZsCreateListings.as_view()),
     path('zs_create_all_listings', ZsCreateAllListings.as_view()),
+    path('zs_export_job/<uuid:job_id>', ZsExportJobStatus.as_view()),
+    path('zs_export_job/<uuid:job_id>/resume', ZsResumeExportJob.as_view()),
+    # async versions of endpoints, they serve many slow upstream requests at once when project runs under ASGI
+    path('async/retail_login', async_views.retail_login),
+    path('async/zs_login', async_views.zs_login),
+    path('async/zs_refresh', async_views.zs_refresh),
+    path('async/retail_get_product_groups', async_views.retail_product_groups),
+    path('async/retail_get_products', async_views.retail_products_with_filter),
+    path('async/retail_get_all_products', async_views.retail_all_products),
+    path('async/zs_create_listings', async_views.zs_create_listings),
+    path('async/zs_create_all_listings', async_views.zs_create_all_listings),
+    path('retail_webhook', RetailWebhook.as_view()),
 ]
@@ -1,13 +1,91 @@
+import itertools
+import json
+from typing import Iterator
+
+from celery import current_app
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.views import APIView
 
-from integration_api.dataclasses import ZsListingsOut
+from integration_api.cache import invalidate_product_groups
+from integration_api.dataclasses import ZsListingsOut, ZoneSmartListing, ListingExportFailure
+from integration_api.enums import TaskStatus, ExportStatus
+from integration_api.models import QuantityChecker, PriceChecker, SyncChecker, ExportJob
 from integration_api.serializers import RetailAuthInputSerializer, ZsAuthInputSerializer,\
     RetailGetProductsWithFilterInputSerializer, RetailAuthWithCheckInputSerializer, ZsListingsOutputSerializer, \
-    ZsCreateListingsInputSerializer, ZsRefreshTokenInputSerializer, ZsCreateAllListingsInputSerializer
+    ZsCreateListingsInputSerializer, ZsRefreshTokenInputSerializer, ZsCreateAllListingsInputSerializer, \
+    ZsListingSerializer, ListingExportFailureSerializer, RetailWebhookInputSerializer, CatalogDeltaOutputSerializer, \
+    ExportJobOutputSerializer
 from integration_api.services import try_retail_login, get_zone_jwt, RetailCRMService, get_access_token, \
     ZoneSmartService, create_periodic_tasks
+from integration_api.webhooks import queue_changed_offers
+
+
+def serializer_context(request) -> dict:
+    """Returns context of input serializers. With ?fresh_check=1 credentials are checked even if their check is cached."""
+    return {'fresh_check': request.query_params.get('fresh_check') == '1'}
+
+
+def is_ndjson_stream(request) -> bool:
+    """Checks if client asked for streaming output with ?stream=ndjson query parameter."""
+    return request.query_params.get('stream') == 'ndjson'
+
+
+def ndjson_listings_response(zone_listings: Iterator[ZoneSmartListing]) -> Response | StreamingHttpResponse:
+    """Returns streaming response that writes one serialized listing per line as soon as it is fetched.
+
+    :param zone_listings: Iterator over Zonesmart listings.
+    :return: Streaming response. If no products available returns 204 http status code.
+    """
+    first_listing = next(zone_listings, None)
+    if first_listing is None:
+        return Response({"Reason": "No available products"}, status=status.HTTP_204_NO_CONTENT)
+
+    def lines():
+        for listing in itertools.chain([first_listing], zone_listings):
+            yield json.dumps(ZsListingSerializer(instance=listing).data, cls=JSONEncoder, ensure_ascii=False) + '\n'
+
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson', status=status.HTTP_200_OK)
+
+
+def is_background_export(request) -> bool:
+    """Checks if client asked to run export on celery worker with ?background=1 query parameter."""
+    return request.query_params.get('background') == '1'
+
+
+def start_export_job(job: ExportJob):
+    """Sends export job to celery worker."""
+    current_app.send_task('export_listings', args=[str(job.pk)])
+
+
+def created_listings_data(exported_listings: list[ZoneSmartListing],
+                          failed_listings: list[ListingExportFailure]) -> dict:
+    """Returns output of created listings and listings that weren't created.
+
+    :param exported_listings: Listings that were created in Zonesmart api.
+    :param failed_listings: Listings that weren't created with failure reasons.
+    """
+    failures_output = ListingExportFailureSerializer(instance=failed_listings, many=True).data
+    if len(exported_listings) > 0:
+        listings_output = ZsListingsOut(listings=exported_listings)
+        output_serializer = ZsListingsOutputSerializer(instance=listings_output)
+        return {**output_serializer.data, "failed_listings": failures_output}
+    else:
+        return {"reason": "No listings were created:(", "failed_listings": failures_output}
+
+
+def created_listings_response(exported_listings: list[ZoneSmartListing],
+                              failed_listings: list[ListingExportFailure]) -> Response:
+    """Returns response with created listings and listings that weren't created.
+
+    :param exported_listings: Listings that were created in Zonesmart api.
+    :param failed_listings: Listings that weren't created with failure reasons.
+    """
+    return Response(created_listings_data(exported_listings, failed_listings), status=status.HTTP_200_OK)
 
 
 class RetailCRMLogin(APIView):
@@ -70,9 +148,10 @@ class ZsCreateAllListings(APIView):
         """
 
         :param request:  Request with zs auth data, retail auth data and price and quantity sync settings.
-        :return: Response with created listings.
+        :return: Response with created listings. With ?background=1 export runs on celery worker and response contains
+        id of export job.
         """
-        serializer = ZsCreateAllListingsInputSerializer(data=request.data)
+        serializer = ZsCreateAllListingsInputSerializer(data=request.data, context=serializer_context(request))
         serializer.is_valid(raise_exception=True)
 
         access = serializer.validated_data['zonesmart_auth']['access']
@@ -80,22 +159,64 @@ class ZsCreateAllListings(APIView):
         sync_settings = serializer.validated_data['price_quantity_sync']
         retail_auth = serializer.validated_data['retail_auth']
 
+        if is_background_export(request):
+            job = ExportJob.objects.create(retail_address=retail_auth['address'],
+                                           retail_api_key=retail_auth['api_key'],
+                                           access_token=access,
+                                           refresh_token=refresh,
+                                           quantity_sync=sync_settings.quantity_sync,
+                                           price_sync=sync_settings.price_sync,
+                                           combined_sync=sync_settings.combined_sync,
+                                           quantity_sync_period=sync_settings.quantity_sync_period,
+                                           price_sync_period=sync_settings.price_sync_period)
+            start_export_job(job)
+            return Response({"job_id": job.pk}, status=status.HTTP_202_ACCEPTED)
+
         retail_service = RetailCRMService(retail_auth['address'], retail_auth['api_key'])
         zs_service = ZoneSmartService(access)
 
-        zone_listings = retail_service.get_all_products()  # list of Zonesmart listings
-
-        exported_listings, listings_of_tracked_products = zs_service.create_listings(zone_listings)
+        # listings are created while next pages of catalog are still being read
+        exported_listings, listings_of_tracked_products, failed_listings = \
+            zs_service.create_listings_pipelined(retail_service.iter_all_products())
 
         if len(listings_of_tracked_products) > 0:
             create_periodic_tasks(sync_settings, listings_of_tracked_products, retail_auth, access, refresh)
 
-        if len(exported_listings) > 0:
-            listings_output = ZsListingsOut(listings=exported_listings)
-            output_serializer = ZsListingsOutputSerializer(instance=listings_output)
-            return Response(output_serializer.data, status=status.HTTP_200_OK)
-        else:
-            return Response({"reason": "No listings were created:("}, status=status.HTTP_200_OK)
+        return created_listings_response(exported_listings, failed_listings)
+
+
+class ZsExportJobStatus(APIView):
+    """Endpoint that shows progress of background export job."""
+
+    def get(self, request, job_id) -> Response:
+        """
+        :param job_id: Id of export job returned by zs_create_all_listings.
+        :return: Response with status, progress, throughput and failed listings of job.
+        """
+        job = ExportJob.objects.filter(pk=job_id).first()
+        if job is None:
+            return Response({"reason": "Export job not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ExportJobOutputSerializer(instance=job).data, status=status.HTTP_200_OK)
+
+
+class ZsResumeExportJob(APIView):
+    """Endpoint that continues interrupted export job from its last checkpoint."""
+
+    def post(self, request, job_id) -> Response:
+        """
+        :param job_id: Id of export job returned by zs_create_all_listings.
+        :return: Response with resume status.
+        """
+        job = ExportJob.objects.filter(pk=job_id).first()
+        if job is None:
+            return Response({"reason": "Export job not found"}, status=status.HTTP_404_NOT_FOUND)
+        if job.status == ExportStatus.finished:
+            return Response({"reason": "Export job is finished"}, status=status.HTTP_409_CONFLICT)
+        if job.status == ExportStatus.running and job.updated_at > timezone.now() - settings.EXPORT_JOB_STALE_TIMEOUT:
+            return Response({"reason": "Export job is running"}, status=status.HTTP_409_CONFLICT)
+
+        start_export_job(job)
+        return Response({"job_id": job.pk, "next_page": job.next_page}, status=status.HTTP_202_ACCEPTED)
 
 
 class ZsCreateListings(APIView):
@@ -106,7 +227,7 @@ class ZsCreateListings(APIView):
         :param request: Request with array of Zonesmart listings, zs auth data, retail auth data and price and quantity sync settings.
         :return: Response with created listings.
         """
-        serializer = ZsCreateListingsInputSerializer(data=request.data)
+        serializer = ZsCreateListingsInputSerializer(data=request.data, context=serializer_context(request))
         serializer.is_valid(raise_exception=True)
 
         access = serializer.validated_data['zonesmart_auth']['access']
@@ -117,17 +238,13 @@ class ZsCreateListings(APIView):
         sync_settings = serializer.validated_data['price_quantity_sync']
         retail_auth = serializer.validated_data['retail_auth']
 
-        exported_listings, listings_of_tracked_products = zs_service.create_listings(serializer.validated_data['listings'])
+        exported_listings, listings_of_tracked_products, failed_listings = \
+            zs_service.create_listings(serializer.validated_data['listings'])
 
         if len(listings_of_tracked_products) > 0:
             create_periodic_tasks(sync_settings, listings_of_tracked_products, retail_auth, access, refresh)
 
-        if len(exported_listings) > 0:
-            listings_output = ZsListingsOut(listings=exported_listings)
-            output_serializer = ZsListingsOutputSerializer(instance=listings_output)
-            return Response(output_serializer.data, status=status.HTTP_200_OK)
-        else:
-            return Response({"reason": "No listings were created:("}, status=status.HTTP_200_OK)
+        return created_listings_response(exported_listings, failed_listings)
 
 
 class RetailAllProducts(APIView):
@@ -137,12 +254,16 @@ class RetailAllProducts(APIView):
         """
         :param request: Request with retail address and api key.
         :return: Response with list of products. If no products available returns 204 http status code.
+        With ?stream=ndjson products are streamed one listing per line.
         """
-        serializer = RetailAuthWithCheckInputSerializer(data=request.data)
+        serializer = RetailAuthWithCheckInputSerializer(data=request.data, context=serializer_context(request))
         serializer.is_valid(raise_exception=True)
 
         retail_service = RetailCRMService(serializer.validated_data['address'], serializer.validated_data['api_key'])
 
+        if is_ndjson_stream(request):
+            return ndjson_listings_response(retail_service.iter_all_products())
+
         zone_listings = retail_service.get_all_products()  # list of Zonesmart listings
         listings_output = ZsListingsOut(listings=zone_listings)  # class with attribute listings so serializer can work
 
@@ -154,6 +275,25 @@ class RetailAllProducts(APIView):
         return Response(output_serializer.data, status=status.HTTP_200_OK)
 
 
+class RetailChangedProducts(APIView):
+    """Endpoint that detects products of RetailCRM catalog that were added, changed or removed since last request."""
+
+    def post(self, request) -> Response:
+        """
+        :param request: Request with retail address and api key.
+        :return: Response with added and changed products and skus of removed products. First request of account
+        returns all products as added.
+        """
+        serializer = RetailAuthWithCheckInputSerializer(data=request.data, context=serializer_context(request))
+        serializer.is_valid(raise_exception=True)
+
+        retail_service = RetailCRMService(serializer.validated_data['address'], serializer.validated_data['api_key'])
+        delta = retail_service.get_products_delta()
+
+        output_serializer = CatalogDeltaOutputSerializer(instance=delta)
+        return Response(output_serializer.data, status=status.HTTP_200_OK)
+
+
 class RetailProductsWithFilter(APIView):
     """Endpoint that gets products from RetailCRM api depending on filters."""
 
@@ -163,15 +303,19 @@ class RetailProductsWithFilter(APIView):
         groups: [int](array of ids).
 
         :return: Response with list of products depending on filters. If no products available returns 204 http status code
+        With ?stream=ndjson products are streamed one listing per line.
         """
 
-        serializer = RetailGetProductsWithFilterInputSerializer(data=request.data)
+        serializer = RetailGetProductsWithFilterInputSerializer(data=request.data, context=serializer_context(request))
         serializer.is_valid(raise_exception=True)
 
         retail_service = RetailCRMService(**serializer.validated_data['retail_auth'])
 
         filters = serializer.validated_data['filters']
 
+        if is_ndjson_stream(request):
+            return ndjson_listings_response(retail_service.iter_products_with_filters(filters))
+
         zone_listings = retail_service.get_products_with_filters(filters)
 
         listings_output = ZsListingsOut(listings=zone_listings)  # class with attribute listings so serializer can work
@@ -203,3 +347,50 @@ class RetailProductGroups(APIView):
             return Response(groups, status=status.HTTP_200_OK)
         else:
             return Response({"reason": "No groups available"}, status=status.HTTP_204_NO_CONTENT)
+
+
+class RetailInvalidateProductGroups(APIView):
+    """Endpoint that removes cached product groups of RetailCRM shop."""
+
+    def post(self, request) -> Response:
+        """
+        :param request: Request with RetailCRM address and api key fields.
+        :return: Response with invalidation status.
+        """
+        serializer = RetailAuthWithCheckInputSerializer(data=request.data, context=serializer_context(request))
+        serializer.is_valid(raise_exception=True)
+
+        invalidate_product_groups(serializer.validated_data['address'])
+        return Response({"invalidated": True}, status=status.HTTP_200_OK)
+
+
+class RetailWebhook(APIView):
+    """Endpoint that receives RetailCRM trigger requests about changed price or stock of offers.
+
+    Only tracked products of changed offers are synced, periodic tasks stay as a safety net for missed webhooks.
+    """
+
+    def post(self, request) -> Response:
+        """
+        :param request: Request with RetailCRM address, api key and ids of changed offers.
+        :return: Response with amount of offers queued for sync.
+        """
+        serializer = RetailWebhookInputSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        checkers = list()
+        for checker_model in (QuantityChecker, PriceChecker, SyncChecker):
+            checkers.extend(checker_model.objects.filter(retail_address=data['address'], retail_api_key=data['api_key'],
+                                                         status=TaskStatus.active))
+        if len(checkers) == 0:
+            return Response({"reason": "No sync tasks for this RetailCRM account"}, status=status.HTTP_404_NOT_FOUND)
+
+        queued_offers = 0
+        for checker in checkers:
+            offer_ids = list(checker.tracked_products.filter(retail_id__in=data['offer_ids'])
+                             .values_list('retail_id', flat=True).distinct())
+            if len(offer_ids) > 0:
+                queue_changed_offers(checker, offer_ids)
+                queued_offers += len(offer_ids)
+        return Response({"queued_offers": queued_offers}, status=status.HTTP_202_ACCEPTED)
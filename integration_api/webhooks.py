@@ -0,0 +1,46 @@
+import redis
+from celery import current_app
+from django.conf import settings
+
+from integration_api.cache import get_redis
+
+
+def changed_offers_key(checker) -> str:
+    """Returns Redis key of set with RetailCRM offers of checker that were changed since last targeted sync."""
+    return f"changed_offers:{checker.__class__.__name__}:{checker.pk}"
+
+
+def queue_changed_offers(checker, offer_ids: list[str]):
+    """Schedules sync of changed offers of checker.
+
+    Offers changed in WEBHOOK_DEBOUNCE seconds after first change are synced by the same task, so burst of webhooks
+    leads to one sync. If Redis is not available, offers are synced at once.
+
+    :param offer_ids: Ids of RetailCRM offers that are tracked by checker.
+    """
+    key = changed_offers_key(checker)
+    try:
+        with get_redis().pipeline() as pipe:
+            pipe.sadd(key, *offer_ids)
+            pipe.set(f"{key}:scheduled", 1, nx=True, ex=settings.SYNC_LOCK_TIMEOUT)
+            _, scheduled = pipe.execute()
+    except redis.RedisError:
+        current_app.send_task('sync_changed_products', args=[checker.__class__.__name__, checker.pk, offer_ids])
+        return
+
+    if scheduled:
+        current_app.send_task('sync_changed_products', args=[checker.__class__.__name__, checker.pk],
+                              countdown=settings.WEBHOOK_DEBOUNCE)
+
+
+def pop_changed_offers(checker) -> list[str]:
+    """Removes and returns changed offers of checker. Changes that come after this call schedule a new sync."""
+    key = changed_offers_key(checker)
+    try:
+        with get_redis().pipeline() as pipe:
+            pipe.smembers(key)
+            pipe.delete(key, f"{key}:scheduled")
+            offer_ids, _ = pipe.execute()
+    except redis.RedisError:
+        return list()
+    return [offer_id.decode() for offer_id in offer_ids]
@@ -1,3 +1,4 @@
+import datetime
 from pathlib import Path
 import django.db.models.signals
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -130,3 +131,58 @@ CELERY_BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': 3600}
 CELERY_RESULT_BACKEND = 'redis://' + REDIS_HOST + ':' + REDIS_PORT + '/0'
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 CELERY_IMPORTS = ('zs_integration_module.tasks',)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://' + REDIS_HOST + ':' + REDIS_PORT + '/1',
+    }
+}
+CACHE_REFRESH_LOCK_TIMEOUT = 30  # seconds other workers wait for a value that is being refreshed
+CREDENTIALS_VALIDATION_CACHE_TTL = 60  # seconds successful credentials check is trusted by input serializers
+
+
+# RetailCRM related settings
+RETAILCRM_PAGE_SIZE = 100  # biggest page size RetailCRM api accepts for catalog methods
+RETAILCRM_FETCH_WORKERS = 4  # amount of pages that are fetched concurrently
+RETAILCRM_INVENTORIES_PAGE_SIZE = 250  # biggest page size RetailCRM api accepts for inventories
+RETAILCRM_GROUPS_CACHE_TTL = 60 * 15  # seconds product groups are kept in cache
+
+# Zonesmart related settings
+ZONESMART_TOKEN_REFRESH_MARGIN = 60 * 5  # access token is refreshed when it expires in less than this amount of seconds
+ZONESMART_CREATE_WORKERS = 8  # amount of listings that are created concurrently
+ZONESMART_FETCH_WORKERS = 8  # amount of listings that are fetched concurrently during sync
+ZONESMART_BULK_UPDATE_SIZE = 100  # amount of inventory items sent in one bulk_update request
+
+# Outgoing HTTP connections settings
+HTTP_POOL_CONNECTIONS = 10  # amount of hosts that keep their own connection pool
+HTTP_POOL_MAXSIZE = 20  # connections kept alive per host, should be not less than amount of worker threads
+HTTP_KEEP_ALIVE = True
+HTTP_CONNECT_TIMEOUT = 5  # seconds
+HTTP_READ_TIMEOUT = 60  # seconds
+
+REST_FRAMEWORK = {
+    'EXCEPTION_HANDLER': 'integration_api.exceptions.upstream_exception_handler',
+}
+
+# Upstream rate limits, requests per second per account of upstream api host
+UPSTREAM_RATE_LIMITS = {
+    'api.zonesmart.com': 10,
+}
+UPSTREAM_DEFAULT_RATE_LIMIT = 10  # for hosts that are not listed, for example RetailCRM shops
+UPSTREAM_RATE_LIMIT_BURST = 10  # amount of requests that can be sent at once after idle period
+UPSTREAM_MIN_RATE = 0.5  # rate is halved on every throttled request, but not lower than this value
+UPSTREAM_RATE_RECOVERY = 0.1  # requests per second regained every second without throttling
+UPSTREAM_MAX_RETRIES = 5
+UPSTREAM_BACKOFF_BASE = 1  # seconds, doubled on every retry if upstream api doesn't send Retry-After
+UPSTREAM_BACKOFF_MAX = 60  # seconds
+
+# Sync related settings
+SYNC_CHUNK_SIZE = 1000  # amount of tracked products that are read from database and compared at once
+SYNC_FULL_RECONCILE_INTERVAL = datetime.timedelta(hours=6)  # how often unchanged products are compared with Zonesmart, None disables
+SYNC_LOCK_TIMEOUT = 600  # seconds lock of checker lives without being extended by running sync
+SYNC_START_SPREAD = 1.0  # part of period over which first runs of checkers are spread, 0 starts checkers at once
+WEBHOOK_DEBOUNCE = 5  # seconds webhook changes of one checker are collected before they are synced together
+
+# Export related settings
+EXPORT_JOB_STALE_TIMEOUT = datetime.timedelta(minutes=10)  # running job without checkpoint for this long can be resumed
+EXPORT_PIPELINE_QUEUE_SIZE = 200  # listings read from RetailCRM that may wait for creation in Zonesmart
@@ -1,36 +1,406 @@
+import datetime
 import json
+from typing import Callable
 
-from celery import shared_task
+from celery import shared_task, chord, current_app
+from celery.signals import task_revoked
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, QuerySet
+from django.utils import timezone
 
-from integration_api.models import PriceChecker, QuantityChecker
+from integration_api.dataclasses import SyncStats, PriceQuantitySync
+from integration_api.enums import OverlapPolicy, ExportStatus
+from integration_api.exceptions import UpstreamAuthError, UpstreamUnavailable
+from integration_api.locks import acquire_sync_lock, extend_sync_lock, release_sync_lock, request_rerun, pop_rerun
+from integration_api.models import PriceChecker, QuantityChecker, SyncChecker, iter_product_chunks, ExportJob, \
+    ExportFailure, ExportedListing
 from integration_api.services import ZoneSmartService, RetailCRMService, try_retail_login, compare_and_update_prices, \
-    compare_and_update_quantity
+    compare_and_update_quantity, ZoneStateLoader, save_tracked_products, create_checkers, collect_created_listings
+from integration_api.tokens import ZoneSmartTokenManager
+from integration_api.webhooks import queue_changed_offers, pop_changed_offers
+
+CHECKER_MODELS = {
+    'QuantityChecker': QuantityChecker,
+    'PriceChecker': PriceChecker,
+    'SyncChecker': SyncChecker,
+}
+
+# fields that are synced by checkers
+CHECKER_FIELDS = {
+    'QuantityChecker': ['quantity'],
+    'PriceChecker': ['price'],
+    'SyncChecker': ['price', 'quantity'],
+}
+
+# periodic tasks and checkers they sync
+CHECKER_TASKS = {
+    'update_products_quantity': QuantityChecker,
+    'update_products_price': PriceChecker,
+    'sync_products': SyncChecker,
+}
+
+
+def run_with_services(retail_address: str, retail_api_key: str, access_token: str, refresh_token: str,
+                      sync: Callable[[RetailCRMService, ZoneSmartService], None]) -> bool:
+    """Runs sync with RetailCRM and Zonesmart services.
+
+    Credentials are checked only if upstream api rejects them.
+
+    :param sync: Function that compares and updates products.
+    :return: False if retail or zonesmart auth data is not valid anymore.
+    """
+    token_manager = ZoneSmartTokenManager(access_token, refresh_token)
+    access = token_manager.get_access()
+    if access is False:
+        return False
+
+    try:
+        sync(RetailCRMService(retail_address, retail_api_key), ZoneSmartService(access))
+        return True
+    except UpstreamAuthError:
+        # token could be revoked or expire earlier than expected, next run will use new one
+        return try_retail_login(retail_address, retail_api_key) and token_manager.refresh_access(force=True) is not False
+    except UpstreamUnavailable as e:
+        # products that weren't compared yet are synced by next run, credentials are fine
+        print(f"Sync of {retail_address} is interrupted, upstream api is unavailable: {e}")
+        return True
+
+
+def get_shard_ranges(checker, shard_size: int) -> list[list[int]]:
+    """Splits tracked products of checker into shards.
+
+    :return: List of shards, every shard is [first product pk, last product pk].
+    """
+    product_ids = list(checker.tracked_products.order_by('pk').values_list('pk', flat=True))
+    return [[product_ids[i], product_ids[min(i + shard_size, len(product_ids)) - 1]]
+            for i in range(0, len(product_ids), shard_size)]
+
+
+def count_skipped_run(checker):
+    """Increments amount of skipped sync runs of checker."""
+    checker.__class__.objects.filter(pk=checker.pk).update(skipped_runs=F('skipped_runs') + 1,
+                                                           last_skipped_at=timezone.now())
+
+
+def skip_overlapping_run(checker):
+    """Handles sync run that was started while previous run of checker is still in progress."""
+    count_skipped_run(checker)
+    if checker.overlap_policy == OverlapPolicy.coalesce:
+        request_rerun(checker)  # runs postponed during one sync are merged, so at most one run waits for it
+        print(f"Sync of {checker.retail_address} is still running, run is postponed until it finishes")
+    else:
+        print(f"Sync of {checker.retail_address} is still running, run is skipped")
+
+
+def start_rerun(checker):
+    """Starts sync run that was postponed while previous run was in progress."""
+    if pop_rerun(checker) and checker.task is not None:
+        current_app.send_task(checker.task.task, args=json.loads(checker.task.args), expires=checker.expire_seconds)
+
+
+def sync_querysets(checker, querysets: list[QuerySet], fields: list[str], lock_token: str) -> dict:
+    """Syncs products of querysets one after another.
+
+    :param querysets: Querysets of tracked products of checker.
+    :param fields: Fields to sync, 'price' and/or 'quantity'.
+    :param lock_token: Token of checker sync lock, lock is extended after every chunk of products.
+    :return: Sync stats and credentials status.
+    """
+    stats = SyncStats()
+
+    def sync(retail_service: RetailCRMService, zonesmart_service: ZoneSmartService):
+        nonlocal stats
+        for products in querysets:
+            for json_products in iter_product_chunks(products, settings.SYNC_CHUNK_SIZE):
+                zone_state = ZoneStateLoader(zonesmart_service)  # listings are fetched at most once for both fields
+                chunk_stats = SyncStats(products=len(json_products))  # product synced for both fields is counted once
+                if 'price' in fields:
+                    price_stats = compare_and_update_prices(json_products, retail_service, zonesmart_service,
+                                                            zone_state)
+                    chunk_stats += SyncStats(updated=price_stats.updated, failed=price_stats.failed)
+                if 'quantity' in fields:
+                    quantity_stats = compare_and_update_quantity(json_products, retail_service, zonesmart_service,
+                                                                 zone_state)
+                    chunk_stats += SyncStats(updated=quantity_stats.updated, failed=quantity_stats.failed)
+                stats += chunk_stats
+                extend_sync_lock(checker, lock_token)
+
+    credentials_valid = run_with_services(checker.retail_address, checker.retail_api_key, checker.access_token,
+                                          checker.refresh_token, sync)
+    return {'credentials_valid': credentials_valid, **stats.__dict__}
+
+
+def sync_shards(checker, shards: list[list[int]], fields: list[str], lock_token: str) -> dict:
+    """Syncs products of shards one after another.
+
+    :param shards: Shards returned by get_shard_ranges.
+    :param fields: Fields to sync, 'price' and/or 'quantity'.
+    :param lock_token: Token of checker sync lock.
+    :return: Sync stats of shards and credentials status.
+    """
+    querysets = [checker.tracked_products.filter(pk__gte=first_pk, pk__lte=last_pk) for first_pk, last_pk in shards]
+    return sync_querysets(checker, querysets, fields, lock_token)
+
+
+def finish_sync(checker, fields: list[str], started_at: datetime.datetime, results: list[dict]):
+    """Saves result of sync run.
+
+    :param results: Results of sync_shards calls.
+    """
+    if not all(result['credentials_valid'] for result in results):
+        pop_rerun(checker)
+        checker.delete()  # deleting periodic task if retail or zonesmart auth data is not valid
+        return
+
+    stats = sum((SyncStats(result['products'], result['updated'], result['failed']) for result in results),
+                SyncStats())
+    print(f"Synced {', '.join(fields)} of {checker.retail_address}: {stats.products} compared, "
+          f"{stats.updated} updated, {stats.failed} failed")
+
+    if isinstance(checker, SyncChecker):
+        if 'price' in fields:
+            checker.price_synced_at = started_at
+        if 'quantity' in fields:
+            checker.quantity_synced_at = started_at
+        checker.save(update_fields=['price_synced_at', 'quantity_synced_at'])
+
+
+def run_checker(checker, fields: list[str]):
+    """Syncs products of checker. Big checkers are split into shards that are synced by parallel worker tasks.
+
+    :param fields: Fields to sync, 'price' and/or 'quantity'.
+    """
+    lock_token = acquire_sync_lock(checker)
+    if lock_token is None:
+        skip_overlapping_run(checker)
+        return
+
+    started_at = timezone.now()
+    shards = get_shard_ranges(checker, checker.shard_size)
+    if len(shards) <= 1:
+        try:
+            finish_sync(checker, fields, started_at, [sync_shards(checker, shards, fields, lock_token)])
+        finally:
+            release_sync_lock(checker, lock_token)
+        start_rerun(checker)
+        return
+
+    lanes_count = min(max(checker.max_parallelism, 1), len(shards))
+    lanes = [shards[i::lanes_count] for i in range(lanes_count)]
+    checker_model = checker.__class__.__name__
+    # lock is held until callback, if shard task fails callback isn't called and errback releases lock instead
+    callback = finish_sharded_sync.s(checker_model, checker.pk, fields, started_at.isoformat(), lock_token)
+    callback.on_error(abort_sharded_sync.s(checker_model, checker.pk, lock_token))
+    chord(sync_products_shards.s(checker_model, checker.pk, lane, fields, lock_token) for lane in lanes)(callback)
+
+
+@shared_task(name='sync_products_shards')
+def sync_products_shards(checker_model: str, checker_id: int, shards: list[list[int]], fields: list[str],
+                         lock_token: str) -> dict:
+    checker = CHECKER_MODELS[checker_model].objects.filter(pk=checker_id).first()
+    if checker is None:
+        return {'credentials_valid': True, **SyncStats().__dict__}
+    return sync_shards(checker, shards, fields, lock_token)
+
+
+@shared_task(name='finish_sharded_sync')
+def finish_sharded_sync(results: list[dict], checker_model: str, checker_id: int, fields: list[str], started_at: str,
+                        lock_token: str):
+    checker = CHECKER_MODELS[checker_model].objects.filter(pk=checker_id).first()
+    if checker is None:
+        return
+    try:
+        finish_sync(checker, fields, datetime.datetime.fromisoformat(started_at), results)
+    finally:
+        release_sync_lock(checker, lock_token)
+    start_rerun(checker)
+
+
+@shared_task(name='abort_sharded_sync')
+def abort_sharded_sync(request, exc, traceback, checker_model: str, checker_id: int, lock_token: str):
+    """Errback of sharded sync chord. Releases lock of checker and starts postponed run when shard task fails."""
+    checker = CHECKER_MODELS[checker_model].objects.filter(pk=checker_id).first()
+    if checker is None:
+        return
+    print(f"Sync of {checker.retail_address} failed: {exc}")
+    release_sync_lock(checker, lock_token)
+    start_rerun(checker)
+
+
+@shared_task(name='sync_changed_products')
+def sync_changed_products(checker_model: str, checker_id: int, offer_ids: list[str] | None = None):
+    """Syncs tracked products of RetailCRM offers that were reported by webhook.
+
+    :param offer_ids: Changed offers. If not passed, offers collected by debounce are synced.
+    """
+    checker = CHECKER_MODELS[checker_model].objects.filter(pk=checker_id).first()
+    if checker is None:
+        return
+    if offer_ids is None:
+        offer_ids = pop_changed_offers(checker)
+    if len(offer_ids) == 0:
+        return
+
+    lock_token = acquire_sync_lock(checker)
+    if lock_token is None:
+        queue_changed_offers(checker, offer_ids)  # synced after debounce delay, when running sync may be finished
+        return
+
+    try:
+        fields = CHECKER_FIELDS[checker_model]
+        products = checker.tracked_products.filter(retail_id__in=offer_ids)
+        result = sync_querysets(checker, [products], fields, lock_token)
+    finally:
+        release_sync_lock(checker, lock_token)
+
+    if not result['credentials_valid']:
+        checker.delete()  # deleting periodic task if retail or zonesmart auth data is not valid
+        return
+    print(f"Synced {', '.join(fields)} of changed offers of {checker.retail_address}: {result['products']} compared, "
+          f"{result['updated']} updated, {result['failed']} failed")
+    start_rerun(checker)
 
 
 @shared_task(name='update_products_price')
-def update_products_price(retail_address: str, retail_api_key: str, access_token: str, refresh_token: str, products):
-    retail_login_check = try_retail_login(retail_address, retail_api_key)  # checking retail auth data
-    zonesmart_service = ZoneSmartService(access_token)
-    refresh_check = zonesmart_service.check_refresh(refresh_token)  # checking refresh token
-    if refresh_check is False or retail_login_check is False:
-        PriceChecker.objects.get(retail_address=retail_address, # deleting periodic task if retail or zonesmart auth data is not valid
-                                 retail_api_key=retail_api_key,
-                                 products=products).delete()
-
-    retail_service = RetailCRMService(retail_address, retail_api_key)
-    json_products = json.loads(products)
-    compare_and_update_prices(json_products, retail_service, zonesmart_service)
+def update_products_price(checker_id: int):
+    checker = PriceChecker.objects.filter(pk=checker_id).first()
+    if checker is not None:
+        run_checker(checker, ['price'])
+
 
 @shared_task(name='update_products_quantity')
-def update_products_quantity(retail_address, retail_api_key, access_token, refresh_token, products):
-    retail_login_check = try_retail_login(retail_address, retail_api_key) # checking retail auth data
-    zonesmart_service = ZoneSmartService(access_token)
-    refresh_check = zonesmart_service.check_refresh(refresh_token)  # checking refresh token
-    if refresh_check is False or retail_login_check is False:
-        QuantityChecker.objects.get(retail_address=retail_address, # deleting periodic task if retail or zonesmart auth data is not valid
-                                    retail_api_key=retail_api_key,
-                                    products=products).delete()
-
-    retail_service = RetailCRMService(retail_address, retail_api_key)
-    json_products = json.loads(products)
-    compare_and_update_quantity(json_products, retail_service, zonesmart_service)
+def update_products_quantity(checker_id: int):
+    checker = QuantityChecker.objects.filter(pk=checker_id).first()
+    if checker is not None:
+        run_checker(checker, ['quantity'])
+
+
+@shared_task(name='sync_products')
+def sync_products(checker_id: int):
+    """Syncs price and quantity of products in one pass. Every field is synced only when its own period is due."""
+    checker = SyncChecker.objects.filter(pk=checker_id).first()
+    if checker is None:
+        return
+
+    now = timezone.now()
+    fields = list()
+    if checker.is_price_due(now):
+        fields.append('price')
+    if checker.is_quantity_due(now):
+        fields.append('quantity')
+    if len(fields) > 0:
+        run_checker(checker, fields)
+
+
+def claim_export_job(job_id: str) -> ExportJob | None:
+    """Marks export job as running.
+
+    Job that is running in another worker is not claimed, unless it didn't save checkpoint for
+    EXPORT_JOB_STALE_TIMEOUT, that means its worker was killed.
+
+    :return: Claimed job or None if job is finished or is running.
+    """
+    now = timezone.now()
+    claimed = ExportJob.objects.filter(pk=job_id).exclude(status=ExportStatus.finished) \
+        .filter(~Q(status=ExportStatus.running) | Q(updated_at__lt=now - settings.EXPORT_JOB_STALE_TIMEOUT)) \
+        .update(status=ExportStatus.running, error=None, updated_at=now)
+    if claimed == 0:
+        return None
+    return ExportJob.objects.get(pk=job_id)
+
+
+def run_export_job(job: ExportJob):
+    """Exports RetailCRM products to Zonesmart page by page starting from checkpoint of job.
+
+    Checkpoint is saved after every page. Every created listing is recorded as soon as its result is taken, so page
+    that was interrupted before its checkpoint is exported again without listings that were already created. Only
+    listings that were being created at the moment of interruption can be created twice.
+    """
+    token_manager = ZoneSmartTokenManager(job.access_token, job.refresh_token)
+    retail_service = RetailCRMService(job.retail_address, job.retail_api_key)
+    sync_settings = PriceQuantitySync(job.quantity_sync, job.price_sync, job.price_sync_period,
+                                      job.quantity_sync_period, job.combined_sync)
+    track_products = job.quantity_sync or job.price_sync
+    exported_skus = set(job.exported.values_list('listing_sku', flat=True))
+
+    for page, total_pages, listings in retail_service.iter_product_pages(job.next_page):
+        access = token_manager.get_access()  # long export can outlive access token
+        if access is False:
+            raise UpstreamAuthError("Zonesmart refresh token is not valid")
+
+        pending_listings = [listing for listing in listings if str(listing.listing_sku) not in exported_skus]
+        failed_listings = list()
+        if len(pending_listings) > 0:
+            zs_service = ZoneSmartService(access)
+            if job.warehouse_id is None:
+                job.warehouse_id = zs_service.create_default_warehouse()
+                job.save(update_fields=['warehouse_id'])
+            for listing, result in zs_service.iter_created_listings(pending_listings):
+                exported, listings_of_tracked_products, failed = collect_created_listings([(listing, result)],
+                                                                                          job.warehouse_id)
+                failed_listings.extend(failed)
+                if len(exported) == 0:
+                    continue
+                with transaction.atomic():
+                    ExportedListing.objects.create(job=job, listing_sku=str(listing.listing_sku))
+                    if track_products and len(listings_of_tracked_products) > 0:
+                        job.tracked_products.add(*save_tracked_products(listings_of_tracked_products))
+                exported_skus.add(str(listing.listing_sku))
+
+        with transaction.atomic():
+            ExportFailure.objects.bulk_create([ExportFailure(job=job, **failure.__dict__)
+                                               for failure in failed_listings])
+            job.next_page = page + 1
+            job.total_pages = total_pages
+            job.processed_listings += len(listings)
+            job.created_listings = len(exported_skus)
+            job.save()
+        print(f"Export {job.pk}: page {page} of {total_pages}, {job.created_listings} listings created")
+
+    with transaction.atomic():
+        product_ids = list(job.tracked_products.values_list('pk', flat=True))
+        if track_products and len(product_ids) > 0:
+            access = token_manager.get_access()
+            retail_auth = {'address': job.retail_address, 'api_key': job.retail_api_key}
+            create_checkers(sync_settings, product_ids, retail_auth, access or job.access_token, job.refresh_token)
+        job.status = ExportStatus.finished
+        job.finished_at = timezone.now()
+        job.save()
+
+
+@shared_task(name='export_listings', bind=True, acks_late=True, max_retries=None)
+def export_listings(self, job_id: str):
+    """Runs export job. Task is acknowledged after it finishes, so job of killed worker is delivered again.
+
+    Task that is delivered again right after worker is stopped finds job running with fresh checkpoint. It is
+    retried when checkpoint gets stale, so job is resumed without resume request.
+    """
+    job = claim_export_job(job_id)
+    if job is None:
+        if ExportJob.objects.filter(pk=job_id).exclude(status=ExportStatus.finished).exists():
+            raise self.retry(countdown=settings.EXPORT_JOB_STALE_TIMEOUT.total_seconds())
+        return
+    if job.started_at is None:
+        job.started_at = timezone.now()
+        job.save(update_fields=['started_at'])
+
+    try:
+        run_export_job(job)
+    except Exception as e:
+        job.status = ExportStatus.failed
+        job.error = str(e)
+        job.save(update_fields=['status', 'error', 'updated_at'])
+        print(f"Export {job.pk} failed on page {job.next_page}: {e}")
+
+
+@task_revoked.connect
+def count_expired_run(sender=None, request=None, expired=False, **kwargs):
+    """Counts runs that were dropped because they waited in queue longer than period of checker."""
+    checker_model = CHECKER_TASKS.get(getattr(sender, 'name', None))
+    if not expired or checker_model is None or request is None or not request.args:
+        return
+    checker = checker_model.objects.filter(pk=request.args[0]).first()
+    if checker is not None:
+        count_skipped_run(checker)
+        print(f"Sync of {checker.retail_address} waited in queue for too long, run is skipped")